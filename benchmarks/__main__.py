@@ -0,0 +1,104 @@
+"""
+Copyright (C) 2023  kyomi
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import asyncio
+from json import dump
+from logging import INFO, basicConfig
+from platform import platform, python_version
+from time import time
+from typing import Any, Dict, Tuple
+
+from click import Choice, ClickException, echo, group, option
+
+from benchmarks.fixtures import FIXTURES_DIR, find_fixtures, record_fixtures
+from benchmarks.suites import (
+    QUERIES,
+    bench_parse,
+    bench_queries,
+    bench_rtfm,
+    build_fixture,
+)
+
+
+@group()
+def main() -> None:
+    """Offline benchmarks for the RTFM features."""
+    basicConfig(level=INFO, format="[{levelname}] {message}", style="{")
+
+
+@main.command()
+@option("--fixtures", default=FIXTURES_DIR, show_default=True)
+def record(fixtures: str) -> None:
+    """Download the inventory of every RTFM source as fixtures."""
+    asyncio.run(record_fixtures(fixtures))
+
+
+@main.command()
+@option("--fixtures", default=FIXTURES_DIR, show_default=True)
+@option("--output", default="bench_results.json", show_default=True)
+@option("--source", "sources", multiple=True, type=Choice(list(QUERIES)))
+@option("--repeat", default=5, show_default=True)
+@option("--queries", default=500, show_default=True)
+def run(
+    fixtures: str,
+    output: str,
+    sources: Tuple[str, ...],
+    repeat: int,
+    queries: int,
+) -> None:
+    """Run the benchmarks over the recorded fixtures."""
+    paths = find_fixtures(fixtures, sources or QUERIES)
+
+    if not paths:
+        raise ClickException(
+            f'No fixtures found in "{fixtures}", record them with '
+            f'"python -m benchmarks record" first.'
+        )
+
+    results: Dict[str, Any] = {
+        "meta": {
+            "timestamp": time(),
+            "python": python_version(),
+            "platform": platform(),
+            "repeat": repeat,
+            "queries": queries,
+        },
+        "parse": {},
+        "queries": {},
+        "rtfm": {},
+    }
+
+    for key, path in paths.items():
+        echo(f'Benchmarking "{key}" from {path}...')
+
+        with open(path, "rb") as file:
+            data = file.read()
+
+        inventory = build_fixture(key, data)
+
+        results["parse"][key] = bench_parse(key, data, repeat)
+        results["queries"][key] = bench_queries(key, inventory, queries)
+        results["rtfm"][key] = bench_rtfm(key, inventory, queries)
+
+    with open(output, "w", encoding="utf-8") as file:
+        dump(results, file, indent=2)
+
+    echo(f"Results written to {output}.")
+
+
+if __name__ == "__main__":
+    main()
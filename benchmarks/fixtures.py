@@ -0,0 +1,68 @@
+"""
+Copyright (C) 2023  kyomi
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from logging import getLogger
+from os import makedirs, replace
+from os.path import dirname, exists, join
+from typing import Dict, Iterable
+
+from aiohttp import ClientSession
+
+from bot.extensions.api import get_rtfm_sources
+from bot.utils.fetch import InventoryFetcher
+
+log = getLogger(__name__)
+
+# Fixtures use the same layout as RTFM_MIRROR_DIR, so a fixtures
+# directory can also be used as a mirror, and the other way around.
+FIXTURES_DIR = join(dirname(__file__), "fixtures")
+
+
+def get_fixture_path(directory: str, key: str) -> str:
+    return join(directory, get_rtfm_sources()[key].path)
+
+
+def find_fixtures(directory: str, keys: Iterable[str]) -> Dict[str, str]:
+    """Returns the paths of the recorded fixtures of the given sources,
+    keyed by source name. Sources without a fixture are left out.
+    """
+    paths = {key: get_fixture_path(directory, key) for key in keys}
+    return {key: path for key, path in paths.items() if exists(path)}
+
+
+async def record_fixtures(directory: str) -> None:
+    """Downloads the inventory of every RTFM source into the given
+    directory, replacing any previous recording.
+    """
+    async with ClientSession() as session:
+        fetcher = InventoryFetcher(session)
+
+        for key, source in get_rtfm_sources().items():
+            url = source.inventory
+            path = join(directory, source.path)
+
+            async with fetcher.fetch(url, path=path) as resp:
+                assert resp is not None
+                data = await resp.read()
+
+            makedirs(dirname(path), exist_ok=True)
+
+            with open(f"{path}.tmp", "wb") as file:
+                file.write(data)
+
+            replace(f"{path}.tmp", path)
+            log.info(f'Recorded "{key}" ({len(data)} bytes) from {url}.')
@@ -0,0 +1,304 @@
+"""
+Copyright (C) 2023  kyomi
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from asyncio import run
+from concurrent.futures import ThreadPoolExecutor
+from json import loads
+from random import Random
+from statistics import mean, quantiles
+from time import perf_counter, perf_counter_ns
+from tracemalloc import get_traced_memory, start, stop
+from typing import Any, Callable, Dict, List, Sequence, cast
+
+from bot.core import Eris, ErisContext
+from bot.extensions.api import API, get_rtfm_sources
+from bot.utils.fuzzy import finder
+from bot.utils.inventory import (
+    Inventory,
+    SphinxObjectFileReader,
+    build_json_inventory,
+    build_sphinx_inventory,
+    parse_object_inv,
+    parse_objects_json,
+)
+from bot.utils.metrics import MetricsRegistry
+from bot.utils.startup import StartupTimer
+
+SOURCES = get_rtfm_sources()
+
+# Responses are streamed in chunks of this size, see InventoryFetcher.
+CHUNK_SIZE = 16 * 1024
+
+# Queries seen the most in our guilds, with how often they show up
+# relative to each other. Typos and very short queries are included on
+# purpose, as they are the slowest to answer. Only these sources are
+# benchmarked.
+QUERIES = {
+    "stable": {
+        "Embed": 20,
+        "commands.Bot": 12,
+        "Client.wait_for": 6,
+        "on_message": 6,
+        "Intents": 5,
+        "discord.ext.commands.Context": 4,
+        "TextChannel.send": 4,
+        "Embed.add_field": 4,
+        "app_commands.describe": 3,
+        "hybrid_command": 3,
+        "Member.roles": 2,
+        "Interaction.response": 2,
+        "gulid": 1,
+        "e": 1,
+    },
+    "latest": {
+        "Embed": 10,
+        "send": 6,
+        "ui.View": 6,
+        "app_commands.CommandTree.sync": 4,
+        "Guild.fetch_member": 3,
+        "ext.tasks.loop": 2,
+        "Poll": 2,
+        "Messagable": 1,
+        "a": 1,
+    },
+    "python": {
+        "asyncio.gather": 15,
+        "list.sort": 6,
+        "dict": 6,
+        "re.sub": 5,
+        "pathlib.Path": 4,
+        "json.loads": 4,
+        "str.format": 4,
+        "typing.Optional": 3,
+        "datetime.datetime.now": 3,
+        "os.path.join": 3,
+        "subprocess.run": 2,
+        "collections.Counter": 2,
+        "asyncio.gahter": 1,
+        "x": 1,
+    },
+    "djs": {
+        "Client": 10,
+        "Message.reply": 6,
+        "EmbedBuilder": 6,
+        "GatewayIntentBits": 4,
+        "ChatInputCommandInteraction.reply": 4,
+        "Collection": 2,
+        "ButtonBuilder": 2,
+        "Interaction.isChatInputCommand": 2,
+        "Gild": 1,
+        "c": 1,
+    },
+}
+
+
+def make_query_mix(key: str, count: int, seed: int = 0) -> List[str]:
+    """Draws a reproducible sequence of queries for a source, following
+    the weights of :data:`QUERIES`.
+    """
+    queries = QUERIES[key]
+    return Random(seed).choices(
+        list(queries), weights=list(queries.values()), k=count
+    )
+
+
+def summarize(samples: Sequence[float]) -> Dict[str, float]:
+    """Summarizes latencies, in microseconds."""
+    percentiles = quantiles(samples, n=100, method="inclusive")
+    return {
+        "mean_us": mean(samples),
+        "p50_us": percentiles[49],
+        "p90_us": percentiles[89],
+        "p99_us": percentiles[98],
+        "max_us": max(samples),
+    }
+
+
+def split_chunks(data: bytes) -> List[bytes]:
+    return [data[i : i + CHUNK_SIZE] for i in range(0, len(data), CHUNK_SIZE)]
+
+
+def parse_fixture(key: str, data: bytes) -> Dict[str, str]:
+    source = SOURCES[key]
+    page = source.url
+
+    if source.format == "json":
+        return parse_objects_json(loads(data), page)
+
+    reader = SphinxObjectFileReader(split_chunks(data))
+    return parse_object_inv(reader, page)
+
+
+def build_fixture(key: str, data: bytes) -> Inventory:
+    source = SOURCES[key]
+    page = source.url
+
+    if source.format == "json":
+        return build_json_inventory(data, page, 0.0)
+
+    return build_sphinx_inventory(split_chunks(data), page, 0.0)
+
+
+def best_time(func: Callable[[], Any], repeat: int) -> float:
+    times: List[float] = []
+
+    for _ in range(repeat):
+        before = perf_counter()
+        func()
+        times.append(perf_counter() - before)
+
+    return min(times)
+
+
+def bench_parse(key: str, data: bytes, repeat: int) -> Dict[str, Any]:
+    """Measures how fast a fixture is parsed, and parsed and indexed,
+    and how much memory that takes.
+    """
+    entries = len(parse_fixture(key, data))
+    parse = best_time(lambda: parse_fixture(key, data), repeat)
+    build = best_time(lambda: build_fixture(key, data), repeat)
+
+    # Tracing allocations slows everything down, so memory is measured
+    # separately from time.
+    start()
+
+    try:
+        inventory = build_fixture(key, data)
+        retained, peak = get_traced_memory()
+    finally:
+        stop()
+
+    del inventory
+
+    return {
+        "bytes": len(data),
+        "entries": entries,
+        "parse_seconds": parse,
+        "parse_entries_per_second": entries / parse,
+        "build_seconds": build,
+        "build_entries_per_second": entries / build,
+        "peak_memory_bytes": peak,
+        "retained_memory_bytes": retained,
+    }
+
+
+def time_queries(
+    queries: Sequence[str], func: Callable[[str], Any]
+) -> Dict[str, float]:
+    samples: List[float] = []
+
+    for query in queries:
+        before = perf_counter_ns()
+        func(query)
+        samples.append((perf_counter_ns() - before) / 1000)
+
+    return summarize(samples)
+
+
+def bench_queries(
+    key: str, inventory: Inventory, count: int
+) -> Dict[str, Any]:
+    """Measures the latency of fuzzy lookups and autocompletion over a
+    realistic mix of queries, with :func:`finder` as a baseline.
+    """
+    queries = make_query_mix(key, count)
+    names = inventory.table.names
+
+    return {
+        "queries": len(queries),
+        "finder": time_queries(
+            queries, lambda query: finder(query, names, limit=8)
+        ),
+        "index": time_queries(
+            queries, lambda query: inventory.search(query, limit=8)
+        ),
+        "prefix": time_queries(
+            queries, lambda query: inventory.prefixes.search(query, limit=25)
+        ),
+    }
+
+
+class FakeBot:
+    """Stands in for :class:`Eris`, with everything :class:`API` uses
+    when its sources are already loaded.
+    """
+
+    __slots__ = ("session", "executor", "metrics", "startup", "rtfm_follower")
+
+    def __init__(self) -> None:
+        self.session = None
+        self.rtfm_follower = False
+        self.executor = ThreadPoolExecutor()
+        self.metrics = MetricsRegistry()
+        self.startup = StartupTimer()
+
+
+class FakeContext:
+    """Stands in for :class:`ErisContext`, and drops every reply."""
+
+    __slots__ = ("replies",)
+
+    def __init__(self) -> None:
+        self.replies = 0
+
+    async def reply(self, content: str) -> None:
+        self.replies += 1
+
+    async def typing(self) -> None:
+        pass
+
+
+async def _bench_rtfm(
+    key: str, inventory: Inventory, queries: Sequence[str]
+) -> Dict[str, Any]:
+    bot = FakeBot()
+    cog = API(cast(Eris, bot))
+    ctx = cast(ErisContext, FakeContext())
+
+    cog._rtfm_cache[key] = inventory  # type: ignore
+    results = cog._rtfm_results  # type: ignore
+
+    cold: List[float] = []
+    warm: List[float] = []
+
+    try:
+        for query in queries:
+            results.clear()
+
+            before = perf_counter_ns()
+            await cog.do_rtfm(ctx, key, query)
+            cold.append((perf_counter_ns() - before) / 1000)
+
+            before = perf_counter_ns()
+            await cog.do_rtfm(ctx, key, query)
+            warm.append((perf_counter_ns() - before) / 1000)
+    finally:
+        bot.executor.shutdown()
+
+    return {
+        "queries": len(queries),
+        "cold": summarize(cold),
+        "warm": summarize(warm),
+    }
+
+
+def bench_rtfm(key: str, inventory: Inventory, count: int) -> Dict[str, Any]:
+    """Measures :meth:`API.do_rtfm` end to end with a fake context, with
+    and without the result cache.
+    """
+    queries = make_query_mix(key, count)
+    return run(_bench_rtfm(key, inventory, queries))
@@ -15,36 +15,251 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
+from asyncio import Task, create_task
+from logging import getLogger
+from math import isfinite
 from os import environ
-from typing import Any, Type, Union
+from os.path import dirname, join
+from pkgutil import iter_modules
+from time import perf_counter
+from typing import Any, Dict, List, Optional, Sequence, Type, Union
 
 from aiohttp import ClientSession
-from discord import Intents, Interaction, Message
-from discord.ext.commands import Bot, Context  # type: ignore
-from jishaku.modules import find_extensions_in
+from discord import Interaction, Message
+from discord.ext.commands import AutoShardedBot, Context  # type: ignore
 
+from bot.utils.cache_profiles import get_cache_profile
 from bot.utils.context import ErisContext
+from bot.utils.executor import create_executor
+from bot.utils.metrics import MetricsRegistry, MetricsServer
+from bot.utils.monitor import LoopMonitor
+from bot.utils.startup import StartupTimer
+
+log = getLogger(__name__)
 
 environ["JISHAKU_NO_UNDERSCORE"] = "true"
 environ["JISHAKU_NO_DM_TRACEBACK"] = "true"
 
+# Extensions that are not needed to answer users, and can be loaded once
+# the bot is ready instead of delaying it.
+DEFERRED_EXTENSIONS = ("jishaku", "bot.extensions.profiling")
+
+
+def find_extensions() -> List[str]:
+    """Returns the names of the extensions of the bot, including
+    jishaku.
+    """
+    path = join(dirname(__file__), "extensions")
+    modules = [f"bot.extensions.{m.name}" for m in iter_modules([path])]
+
+    return modules + ["jishaku"]
+
 
-class Eris(Bot):
-    """Main bot class. The magic happens here."""
+class Eris(AutoShardedBot):
+    """Main bot class. The magic happens here.
 
-    __slots__ = ("session",)
+    Parameters
+    ----------
+    metrics_port: Optional[:class:`int`]
+        The port to serve metrics and health checks on, if any.
+    startup: Optional[:class:`StartupTimer`]
+        Times the startup of the bot. Defaults to ``None``, which
+        starts a new one.
+    defer_extensions: :class:`bool`
+        Whether to load extensions not needed to answer users once the
+        bot is ready.
+    shard_ids: Optional[Sequence[:class:`int`]]
+        The shards to run. Defaults to ``None``, which runs all of them.
+    shard_count: Optional[:class:`int`]
+        The total number of shards, across every process. Defaults to
+        ``None``, which uses the number recommended by Discord.
+    rtfm_follower: :class:`bool`
+        Whether another process of the cluster fetches the RTFM sources,
+        in which case this one only reloads the snapshot it writes.
+    """
+
+    __slots__ = (
+        "session",
+        "executor",
+        "loop_monitor",
+        "cache_profile",
+        "metrics",
+        "metrics_server",
+        "startup",
+        "defer_extensions",
+        "rtfm_follower",
+        "extensions_version",
+        "_commands_total",
+        "_command_duration",
+        "_deferred",
+    )
+
+    def __init__(
+        self,
+        *,
+        metrics_port: Optional[int] = None,
+        startup: Optional[StartupTimer] = None,
+        defer_extensions: bool = True,
+        shard_ids: Optional[Sequence[int]] = None,
+        shard_count: Optional[int] = None,
+        rtfm_follower: bool = False,
+    ) -> None:
+        self.startup = startup or StartupTimer()
+        self.defer_extensions = defer_extensions
+        self.rtfm_follower = rtfm_follower
+        # Goes up whenever an extension is loaded, unloaded or reloaded,
+        # so whatever is derived from the commands knows to rebuild.
+        self.extensions_version = 0
+        self._deferred: Optional[Task[None]] = None
 
-    def __init__(self) -> None:
         self.session = ClientSession()
 
-        super().__init__(command_prefix="?", intents=Intents.all())
+        # CPU-bound work, like parsing documentation inventories, runs
+        # here so it doesn't block the event loop.
+        workers = environ.get("EXECUTOR_WORKERS")
+        self.executor = create_executor(
+            environ.get("EXECUTOR_TYPE") or "thread",
+            int(workers) if workers else None,
+        )
+        self.loop_monitor = LoopMonitor()
+
+        # Metrics are always recorded, as that's cheap, but only served
+        # when a port is given.
+        self.metrics = MetricsRegistry()
+        self.metrics_server = (
+            MetricsServer(self.metrics, port=metrics_port, health=self.health)
+            if metrics_port is not None
+            else None
+        )
+        self.setup_metrics()
+
+        # What the bot caches, and so how much memory it takes, mostly
+        # depends on the gateway intents.
+        self.cache_profile = profile = get_cache_profile(
+            environ.get("CACHE_PROFILE") or "standard"
+        )
+
+        # None means every shard, though it's not typed as such.
+        shards = list(shard_ids) if shard_ids is not None else None
+
+        super().__init__(
+            command_prefix="?",
+            intents=profile.intents,
+            member_cache_flags=profile.member_cache_flags,
+            chunk_guilds_at_startup=profile.chunk_guilds_at_startup,
+            max_messages=profile.max_messages,
+            shard_ids=shards,  # type: ignore
+            shard_count=shard_count,
+        )
+
+        self.before_invoke(self.before_command)
+        self.after_invoke(self.after_command)
+
+    def setup_metrics(self) -> None:
+        monitor = self.loop_monitor
+
+        self._commands_total = self.metrics.counter(
+            "eris_commands_total",
+            "Number of commands run, by outcome.",
+            ("command", "status"),
+        )
+        self._command_duration = self.metrics.histogram(
+            "eris_command_duration_seconds",
+            "Time spent running commands.",
+            ("command",),
+        )
+
+        self.metrics.callback(
+            "eris_event_loop_blocked_seconds_total",
+            "Total time the event loop was blocked.",
+            lambda: monitor.blocked,
+            kind="counter",
+        )
+        self.metrics.callback(
+            "eris_event_loop_max_lag_seconds",
+            "Longest time the event loop was blocked.",
+            lambda: monitor.max_lag,
+        )
+        self.metrics.callback(
+            "eris_event_loop_lag_seconds",
+            "Time the event loop was blocked when last checked.",
+            lambda: monitor.last_lag,
+        )
+
+    def health(self) -> Dict[str, Any]:
+        """Returns the state of the bot, served as its health check."""
+        latency = self.latency
+
+        return {
+            "ready": self.is_ready(),
+            "latency": latency if isfinite(latency) else None,
+            "guilds": len(self.guilds),
+            "shards": sorted(self.shards),
+        }
 
     # TODO: Maybe document these methods later?
+    async def login(self, token: str) -> None:
+        self.startup.begin("login")
+        await super().login(token)
+
     async def setup_hook(self) -> None:
-        for extension in find_extensions_in("bot/extensions"):
+        self.startup.end("login")
+        self.startup.begin("extensions")
+
+        self.loop_monitor.start()
+
+        if self.metrics_server is not None:
+            await self.metrics_server.start()
+
+        for extension in find_extensions():
+            if self.defer_extensions and extension in DEFERRED_EXTENSIONS:
+                continue
+
             await self.load_extension(extension)
 
-        await self.load_extension("jishaku")
+        self.startup.end("extensions")
+        self.startup.begin("gateway")
+
+    async def on_ready(self) -> None:
+        if self.defer_extensions and self._deferred is None:
+            self.startup.begin("deferred extensions")
+            self._deferred = create_task(self.load_deferred_extensions())
+
+        self.startup.end("gateway")
+        self.startup.complete()
+
+    async def load_deferred_extensions(self) -> None:
+        for extension in DEFERRED_EXTENSIONS:
+            try:
+                await self.load_extension(extension)
+            except Exception:
+                log.exception(f'Could not load extension "{extension}".')
+
+        self.startup.end("deferred extensions")
+
+    async def load_extension(
+        self, name: str, *, package: Optional[str] = None
+    ) -> None:
+        try:
+            await super().load_extension(name, package=package)
+        finally:
+            self.extensions_version += 1
+
+    async def unload_extension(
+        self, name: str, *, package: Optional[str] = None
+    ) -> None:
+        try:
+            await super().unload_extension(name, package=package)
+        finally:
+            self.extensions_version += 1
+
+    async def reload_extension(
+        self, name: str, *, package: Optional[str] = None
+    ) -> None:
+        try:
+            await super().reload_extension(name, package=package)
+        finally:
+            self.extensions_version += 1
 
     async def get_context(
         self,
@@ -55,6 +270,25 @@ class Eris(Bot):
     ) -> Any:
         return await super().get_context(origin, cls=cls)
 
+    async def before_command(self, ctx: ErisContext) -> None:
+        ctx.invoked_at = perf_counter()
+
+    async def after_command(self, ctx: ErisContext) -> None:
+        name = ctx.command.qualified_name if ctx.command else "unknown"
+        status = "error" if ctx.command_failed else "success"
+
+        self._commands_total.inc(name, status)
+
+        if ctx.invoked_at is not None:
+            elapsed = perf_counter() - ctx.invoked_at
+            self._command_duration.observe(elapsed, name)
+
     async def close(self) -> None:
+        if self.metrics_server is not None:
+            await self.metrics_server.stop()
+
+        self.loop_monitor.stop()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
         await self.session.close()
         await super().close()
@@ -16,207 +16,926 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
 import re
-from asyncio import to_thread
+from asyncio import (
+    Task,
+    create_task,
+    gather,
+    get_running_loop,
+    shield,
+    to_thread,
+)
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from heapq import nsmallest
 from io import BytesIO
-from os.path import join
-from typing import Any, Dict, Generator, List, Optional, Tuple, cast
-from zlib import decompressobj
+from logging import getLogger
+from os import environ, makedirs
+from os.path import getsize, join
+from time import perf_counter, time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
-from discord import Message
+from discord import File, Interaction, Message
 from discord.abc import Messageable
-from discord.app_commands import describe
-from discord.ext.commands import Cog, hybrid_group  # type: ignore
+from discord.app_commands import Choice, describe
+from discord.ext import tasks  # type: ignore
+from discord.ext.commands import Cog, hybrid_group, is_owner  # type: ignore
 
 from bot.core import Eris, ErisContext
-from bot.utils.fuzzy import finder
+from bot.utils.cache import ResultCache
+from bot.utils.diff import InventoryDiff
+from bot.utils.executor import iter_threadsafe
+from bot.utils.fetch import FetchResponse, InventoryFetcher
+from bot.utils.fuzzy import FuzzyIndex
+from bot.utils.inventory import (
+    Inventory,
+    build_json_inventory,
+    build_sphinx_inventory,
+    read_json_entries,
+    read_sphinx_entries,
+    update_inventory,
+)
+from bot.utils.shards import ShardPool
+from bot.utils.snapshot import (
+    dump_snapshot,
+    load_snapshot,
+    read_snapshot_generation,
+)
+from bot.utils.sources import RTFMSource, SourceRegistry, SourceStats
+
+log = getLogger(__name__)
+
+# The file the RTFM sources are configured in, unless another one is
+# set in the RTFM_SOURCES environment variable.
+RTFM_SOURCES = "config/rtfm.toml"
+
+# Every source has its own snapshot, so sources can be mapped back and
+# unloaded independently of each other.
+RTFM_SNAPSHOT_DIR = "cache/rtfm"
+
+# Failed refreshes are retried with an exponential backoff, starting at
+# the first delay and capped at the second one (in seconds).
+RTFM_RETRY_DELAYS = (60, 60 * 60)
+
+# How many query results are kept around, and for how long (in seconds).
+# Results are also dropped as soon as their source is refreshed.
+RTFM_RESULTS_SIZE = 1024
+RTFM_RESULTS_TTL = 60 * 60
+
+# How many choices are suggested while typing an entity, and how long
+# (in seconds) looking for fuzzy matches may take when there are not
+# enough names starting with what was typed. Discord caps choices at
+# 25, and their names and values at 100 characters.
+RTFM_CHOICES = 25
+RTFM_CHOICES_TIMEOUT = 0.05
+RTFM_CHOICE_LENGTH = 100
+
+# How long (in seconds) looking for names with typos may take, when a
+# query has no match at all.
+RTFM_TYPOS_TIMEOUT = 0.05
+
+# Searches across every loaded source are cached under this key, which
+# cannot be the name of a source.
+RTFM_ALL = "*"
+# How many results a search across every source gives, how many sources
+# are searched at once, and how long (in seconds) searching one of them
+# may take.
+RTFM_ALL_LIMIT = 8
+RTFM_ALL_WORKERS = 4
+RTFM_ALL_TIMEOUT = 0.5
+
+# Sources with fewer entries than this are searched on the event loop,
+# as handing them to a thread costs more than searching them. Queries
+# that few names start with take 10 to 40ms on 100,000 entries, which
+# would stall every other command.
+RTFM_SEARCH_INLINE = 5000
+
+# Sources with at least this many entries are searched by the shard
+# pool, when RTFM_SHARD_WORKERS is set. Smaller ones are searched
+# faster than a query makes the round trip to the workers.
+RTFM_SHARD_THRESHOLD = 20000
+
+# Discord caps messages at 2000 characters.
+MESSAGE_LENGTH = 2000
+
+MEBIBYTE = 1024 * 1024
+
+# Public attributes of Messageable, which are documented on it instead
+# of on every class implementing it.
+MESSAGEABLE_ATTRIBUTES = frozenset(
+    name for name in dir(Messageable) if name[0] != "_"
+)
+
+
+def get_rtfm_sources() -> SourceRegistry:
+    """Reads the RTFM sources from their configuration file."""
+    return SourceRegistry.from_file(
+        environ.get("RTFM_SOURCES") or RTFM_SOURCES
+    )
+
+
+def get_rtfm_snapshot_path(key: str) -> str:
+    return join(RTFM_SNAPSHOT_DIR, f"{key}.bin")
+
+
+def map_rtfm_snapshot(key: str) -> Tuple[int, Inventory, int]:
+    """Maps the snapshot of an RTFM source into memory, and returns its
+    generation, the inventory and the size of the file.
+    """
+    path = get_rtfm_snapshot_path(key)
+    size = getsize(path)
+    generation, cache = load_snapshot(path)
+    inventory = cache.get(key)
+
+    if inventory is None:
+        raise RuntimeError(f'{path} does not hold the "{key}" source.')
+
+    return generation, inventory, size
+
+
+def is_same_inventory(current: Inventory, other: Inventory) -> bool:
+    """Returns whether two inventories of a source were built from the
+    same response, according to its validators.
+    """
+    if current.etag is None and current.last_modified is None:
+        return False
 
-RTFM_PAGES = {
-    "stable": "https://discordpy.readthedocs.io/en/stable",
-    "latest": "https://discordpy.readthedocs.io/en/latest",
-    "python": "https://docs.python.org/3",
-    "djs": "https://discordjs.dev/docs/packages/discord.js/main",
-}
+    return (current.etag, current.last_modified) == (
+        other.etag,
+        other.last_modified,
+    )
 
-DJS_MANIFEST = "https://docs.discordjs.dev/docs/discord.js/main.json"
 
+class API(Cog):
+    """Commands related to Discord's API."""
 
-class SphinxObjectFileReader:
-    __slots__ = ("stream",)
+    __slots__ = (
+        "bot",
+        "sources",
+        "fetcher",
+        "shards",
+        "_rtfm_cache",
+        "_rtfm_tasks",
+        "_rtfm_backoff",
+        "_rtfm_snapshot",
+        "_rtfm_dirty",
+        "_rtfm_generations",
+        "_rtfm_shared",
+        "_rtfm_stats",
+        "_rtfm_results",
+        "_rtfm_stages",
+        "_rtfm_builds",
+        "_rtfm_entries",
+        "_rtfm_loads",
+        "_rtfm_evictions",
+    )
 
-    BUFSIZE = 16 * 1024
+    def __init__(self, bot: Eris) -> None:
+        self.bot = bot
+        self.sources = get_rtfm_sources()
+        self.fetcher = InventoryFetcher(
+            bot.session, mirror=environ.get("RTFM_MIRROR_DIR") or None
+        )
+        # Large sources are searched by worker processes, one shard of
+        # their names each, when enabled.
+        workers = int(environ.get("RTFM_SHARD_WORKERS") or 0)
+        self.shards = ShardPool(workers) if workers > 0 else None
+
+        # Loaded sources, from the least to the most recently used.
+        self._rtfm_cache: OrderedDict[str, Inventory] = OrderedDict()
+        # In-flight loads, so concurrent lookups of a source that is not
+        # loaded yet share a single fetch instead of starting their own.
+        self._rtfm_tasks: Dict[str, Task[Inventory]] = {}
+        # Number of consecutive failed refreshes of each source, and
+        # when to try again.
+        self._rtfm_backoff: Dict[str, Tuple[int, float]] = {}
+        self._rtfm_snapshot: Optional[Task[None]] = None
+        self._rtfm_dirty: Set[str] = set()
+        # The generation of the snapshot each source is mapped from.
+        self._rtfm_generations: Dict[str, int] = {}
+        # The mapped index of each source the shard pool can search, and
+        # the generation of the snapshot it comes from.
+        self._rtfm_shared: Dict[str, Tuple[int, FuzzyIndex[str]]] = {}
+        self._rtfm_stats = {key: SourceStats() for key in self.sources}
+        # Rendered replies, keyed by source and normalized query.
+        self._rtfm_results: ResultCache[Tuple[str, str], str] = ResultCache(
+            RTFM_RESULTS_SIZE, RTFM_RESULTS_TTL
+        )
 
-    def __init__(self, buffer: bytes) -> None:
-        self.stream = BytesIO(buffer)
+        self.setup_metrics()
 
-    def readline(self) -> str:
-        return self.stream.readline().decode("utf-8")
+    def setup_metrics(self) -> None:
+        metrics = self.bot.metrics
+        results = self._rtfm_results
+
+        self._rtfm_stages = metrics.histogram(
+            "eris_rtfm_stage_seconds",
+            "Time spent in each stage of RTFM lookups.",
+            ("source", "stage"),
+        )
+        self._rtfm_builds = metrics.histogram(
+            "eris_rtfm_build_seconds",
+            "Time spent fetching, parsing and indexing RTFM inventories.",
+            ("source",),
+            buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+        )
+        self._rtfm_entries = metrics.gauge(
+            "eris_rtfm_entries",
+            "Number of entries of each loaded RTFM source.",
+            ("source",),
+        )
+        self._rtfm_loads = metrics.counter(
+            "eris_rtfm_loads_total",
+            "Number of times each RTFM source was loaded.",
+            ("source",),
+        )
+        self._rtfm_evictions = metrics.counter(
+            "eris_rtfm_evictions_total",
+            "Number of times each RTFM source was unloaded to stay under "
+            "the memory budget.",
+            ("source",),
+        )
 
-    def skipline(self) -> None:
-        self.stream.readline()
+        metrics.callback(
+            "eris_rtfm_cache_hits_total",
+            "Number of RTFM lookups answered from the result cache.",
+            lambda: results.hits,
+            kind="counter",
+        )
+        metrics.callback(
+            "eris_rtfm_cache_misses_total",
+            "Number of RTFM lookups not found in the result cache.",
+            lambda: results.misses,
+            kind="counter",
+        )
+        metrics.callback(
+            "eris_rtfm_loaded_bytes",
+            "Size of the snapshots of the loaded RTFM sources.",
+            self.get_rtfm_memory_usage,
+        )
 
-    def read_compressed_chunks(self) -> Generator[bytes, None, None]:
-        decompressor = decompressobj()
+    async def cog_load(self) -> None:
+        self.bot.startup.begin("rtfm warm-up")
 
-        while True:
-            chunk = self.stream.read(self.BUFSIZE)
-            if len(chunk) == 0:
-                break
-            yield decompressor.decompress(chunk)
+        if self.shards is not None:
+            await self.shards.start()
 
-        yield decompressor.flush()
+        for key, source in self.sources.items():
+            if source.preload:
+                await self.reload_rtfm_snapshot(key)
 
-    def read_compressed_lines(self) -> Generator[str, None, None]:
-        buf = b""
+        # Preloaded sources missing from their snapshot, or too old, are
+        # loaded on the first iteration, right away.
+        self.refresh_rtfm_sources.start()
 
-        for chunk in self.read_compressed_chunks():
-            buf += chunk
-            pos = buf.find(b"\n")
+    async def reload_rtfm_snapshot(self, key: str) -> None:
+        # Every process of the host maps the same snapshots, and
+        # switches to a new one once its generation changes.
+        started = perf_counter()
 
-            while pos != -1:
-                yield buf[:pos].decode("utf-8")
-                buf = buf[pos + 1 :]
-                pos = buf.find(b"\n")
+        try:
+            path = get_rtfm_snapshot_path(key)
+            generation = read_snapshot_generation(path)
 
+            if generation == self._rtfm_generations.get(key):
+                return
 
-class API(Cog):
-    """Commands related to Discord's API."""
+            generation, inventory, size = await to_thread(
+                map_rtfm_snapshot, key
+            )
+        except FileNotFoundError:
+            return
+        except (OSError, RuntimeError):
+            log.warning(
+                f'Ignoring the unreadable snapshot of the "{key}" RTFM '
+                f"source.",
+                exc_info=True,
+            )
+            return
 
-    __slots__ = ("bot", "_rtfm_cache")
+        self._rtfm_generations[key] = generation
+        self._rtfm_stats[key].size = size
+        self.share_rtfm_source(key, generation, inventory)
+        self.set_rtfm_source(key, inventory, started)
 
-    _rtfm_cache: Dict[str, Dict[str, str]]
+    async def cog_unload(self) -> None:
+        self.refresh_rtfm_sources.cancel()
 
-    def __init__(self, bot: Eris) -> None:
-        self.bot = bot
+        for task in list(self._rtfm_tasks.values()):
+            task.cancel()
 
-    def parse_object_inv(
-        self, stream: SphinxObjectFileReader, url: str
-    ) -> Dict[str, str]:
-        result: Dict[str, str] = {}
+        if self.shards is not None:
+            self.shards.shutdown()
 
-        inv_version = stream.readline().rstrip()
+    def share_rtfm_source(
+        self, key: str, generation: int, inventory: Inventory
+    ) -> None:
+        # Only mapped inventories can be searched by the shard pool, as
+        # its workers map the same snapshot.
+        if self.shards is None or len(inventory.table) < RTFM_SHARD_THRESHOLD:
+            self._rtfm_shared.pop(key, None)
+            return
+
+        self._rtfm_shared[key] = (generation, inventory.index)
+        self.shards.warm(get_rtfm_snapshot_path(key), key, generation)
+
+    def set_rtfm_source(
+        self,
+        key: str,
+        inventory: Inventory,
+        started: float,
+        diff: Optional[InventoryDiff] = None,
+    ) -> None:
+        current = self._rtfm_cache.get(key)
 
-        if inv_version != "# Sphinx inventory version 2":
-            raise RuntimeError("Invalid objects.inv file version.")
+        if current is not None and diff is not None:
+            # Only the results the changes can affect are dropped.
+            self.invalidate_rtfm_changes(key, diff)
+            self._rtfm_entries.set(len(inventory), key)
 
-        projname = stream.readline().rstrip()[11:]
-        stream.readline().rstrip()[11:]
+        # Results of a source that was only checked again are still
+        # valid, but a new mapping is used all the same, so the previous
+        # file can be released.
+        elif current is None or not is_same_inventory(current, inventory):
+            self.invalidate_rtfm_results(key)
+            self._rtfm_entries.set(len(inventory), key)
 
-        line = stream.readline()
-        if "zlib" not in line:
-            raise RuntimeError(
-                "Invalid objects.inv file, not z-lib compatible."
-            )
+        if current is None:
+            stats = self._rtfm_stats[key]
+            stats.loads += 1
+            stats.load_time = perf_counter() - started
+            self._rtfm_loads.inc(key)
 
-        entry_regex = re.compile(
-            r"(?x)(.+?)\s+(\S*:\S*)\s+(-?\d+)\s+(\S+)\s+(.*)"
-        )
+        # The table and index are swapped together, and lookups already
+        # running hold on to the previous inventory, so they never see a
+        # mix of both.
+        self._rtfm_cache[key] = inventory
 
-        for line in stream.read_compressed_lines():
-            match = entry_regex.match(line.rstrip())
+    def invalidate_rtfm_results(self, key: str) -> None:
+        # Searches across every source may include this one, or miss it.
+        self._rtfm_results.invalidate(lambda k: k[0] in (key, RTFM_ALL))
 
-            if not match:
-                continue
+    def invalidate_rtfm_changes(self, key: str, diff: InventoryDiff) -> None:
+        stale = [f"[`{name}`](" for name in diff.stale]
+        added = list(diff.added)
 
-            name, directive, _, location, dispname = match.groups()
-            domain, _, subdirective = directive.partition(":")
+        def is_affected(cache_key: Tuple[str, str], content: str) -> bool:
+            source, query = cache_key
 
-            if directive == "py:module" and name in result:
-                # From the Sphinx repository: due to a bug in 1.1 and
-                # below, two inventory entries are created for Python
-                # modules, and the first one is correct.
-                continue
+            if source not in (key, RTFM_ALL):
+                return False
 
-            if directive == "std:doc":
-                subdirective = "label"
+            if any(link in content for link in stale):
+                return True
 
-            if location.endswith("$"):
-                location = location[:-1] + name
+            if not added:
+                return False
 
-            key = name if dispname == "-" else dispname
-            prefix = f"{subdirective}:" if domain == "std" else ""
+            # New names may be among the suggestions for typos, or rank
+            # among the results of the queries they match.
+            if content.startswith("Could not find anything"):
+                return True
 
-            if projname == "discord.py":
-                key = key.replace("discord.ext.commands.", "")
-                key = key.replace("discord.", "")
+            pattern = ".*?".join(map(re.escape, query))
+            regex = re.compile(pattern, flags=re.IGNORECASE)
 
-            result[f"{prefix}{key}"] = join(url, location)
+            return any(regex.search(name) for name in added)
 
-        return result
+        if diff:
+            count = self._rtfm_results.invalidate_items(is_affected)
+            log.debug(f'Dropped {count} results of the "{key}" RTFM source.')
 
-    def parse_objects_json(self, data: Dict[str, Any]) -> Dict[str, str]:
-        result: Dict[str, str] = {}
-        base_url = RTFM_PAGES["djs"]
+    def touch_rtfm_source(self, key: str) -> None:
+        stats = self._rtfm_stats[key]
+        stats.lookups += 1
+        stats.last_used = time()
+
+        if key in self._rtfm_cache:
+            self._rtfm_cache.move_to_end(key)
+
+    def get_rtfm_memory_usage(self) -> int:
+        return sum(self._rtfm_stats[key].size for key in self._rtfm_cache)
+
+    def evict_rtfm_sources(self) -> None:
+        budget = self.sources.memory_budget
+        used = self.get_rtfm_memory_usage()
+
+        # The most recently used source is kept, even when it's over the
+        # budget on its own.
+        for key in list(self._rtfm_cache)[:-1]:
+            if used <= budget:
+                break
 
-        for cls in data["classes"]:
-            result[cls["name"]] = f"{base_url}/{cls['name']}"
+            if self.sources[key].preload or key in self._rtfm_tasks:
+                continue
 
-            try:
-                for method in cls["methods"]:
-                    if method["name"].startswith("_"):
-                        continue
+            used -= self._rtfm_stats[key].size
+            self.unload_rtfm_source(key)
 
-                    name = f"{cls['name']}.{method['name']}"
-                    url = f"{base_url}/{cls['name']}#{method['name']}"
-                    result[name] = url
+    def unload_rtfm_source(self, key: str) -> None:
+        stats = self._rtfm_stats[key]
 
-                for prop in cls["props"]:
-                    if prop["name"].startswith("_"):
-                        continue
+        # Lookups still running keep their inventory, and its mapping is
+        # released once they're done with it.
+        del self._rtfm_cache[key]
+        self._rtfm_generations.pop(key, None)
+        self.invalidate_rtfm_results(key)
 
-                    name = f"{cls['name']}.{prop['name']}"
-                    url = f"{base_url}/{cls['name']}#{prop['name']}"
-                    result[name] = url
-            except KeyError:
-                pass
+        if self._rtfm_shared.pop(key, None) is not None:
+            assert self.shards is not None
+            self.shards.release(get_rtfm_snapshot_path(key))
+        self._rtfm_entries.set(0, key)
 
-        for func in data["functions"]:
-            result[func["name"]] = f"{base_url}/{func['name']}"
+        stats.evictions += 1
+        self._rtfm_evictions.inc(key)
+        log.info(
+            f'Unloaded the "{key}" RTFM source ({stats.size} bytes) to stay '
+            f"under the memory budget."
+        )
 
-        return result
+    def is_rtfm_source_stale(
+        self, key: str, inventory: Inventory, now: float
+    ) -> bool:
+        interval = self.sources[key].refresh_interval
+
+        if self.bot.rtfm_follower:
+            # The main process refreshes the sources it has loaded on
+            # time, so followers only step in for the other ones.
+            interval *= 2
+
+        return now - inventory.timestamp >= interval
+
+    def is_rtfm_source_due(self, key: str, now: float) -> bool:
+        if key in self._rtfm_tasks:
+            return False
+
+        _, retry_at = self._rtfm_backoff.get(key, (0, 0.0))
+
+        if now < retry_at:
+            return False
+
+        inventory = self._rtfm_cache.get(key)
+
+        if inventory is None:
+            # Other sources are only loaded on their first lookup, and
+            # followers wait for the snapshots of the main process.
+            return self.sources[key].preload and not self.bot.rtfm_follower
+
+        return self.is_rtfm_source_stale(key, inventory, now)
+
+    @tasks.loop(minutes=1)
+    async def refresh_rtfm_sources(self) -> None:
+        # Snapshots written by other processes of the cluster are picked
+        # up first, so their sources are not fetched again here.
+        for key, source in self.sources.items():
+            if source.preload or key in self._rtfm_cache:
+                await self.reload_rtfm_snapshot(key)
+
+        now = time()
+        due = [
+            key for key in self.sources if self.is_rtfm_source_due(key, now)
+        ]
+
+        await gather(*map(self.refresh_rtfm_source, due))
+        self.bot.startup.end("rtfm warm-up")
+
+    async def refresh_rtfm_source(self, key: str) -> None:
+        # Lookups keep using the current table of the source while this
+        # runs, and if it fails, until the next successful attempt.
+        try:
+            await self.load_rtfm_source(key)
+        except Exception:
+            failures, _ = self._rtfm_backoff.get(key, (0, 0.0))
+            first, last = RTFM_RETRY_DELAYS
+            delay = min(first * 2**failures, last)
+
+            self._rtfm_backoff[key] = (failures + 1, time() + delay)
+            log.warning(
+                f'Could not refresh the "{key}" RTFM source, '
+                f"retrying in {delay} seconds.",
+                exc_info=True,
+            )
+        else:
+            self._rtfm_backoff.pop(key, None)
+
+    async def fetch_rtfm_source(
+        self, key: str
+    ) -> Tuple[Inventory, Optional[InventoryDiff]]:
+        source = self.sources[key]
+        current = self._rtfm_cache.get(key)
+        timestamp = time()
+
+        etag = current.etag if current else None
+        last_modified = current.last_modified if current else None
+
+        async with self.fetcher.fetch(
+            source.inventory,
+            path=source.path,
+            etag=etag,
+            last_modified=last_modified,
+        ) as resp:
+            if resp is None:
+                # Our copy is still up to date, so there's nothing to
+                # parse again.
+                assert current is not None
+                current.timestamp = timestamp
+                return current, InventoryDiff()
+
+            with self._rtfm_builds.time(key):
+                if current is None:
+                    diff = None
+                    inventory = await self.build_rtfm_inventory(
+                        source, resp, timestamp
+                    )
+                else:
+                    inventory, diff = await self.update_rtfm_inventory(
+                        source, resp, timestamp, current
+                    )
+
+        inventory.etag = resp.etag
+        inventory.last_modified = resp.last_modified
+
+        return inventory, diff
+
+    async def read_rtfm_chunks(self, resp: FetchResponse) -> Iterable[bytes]:
+        if isinstance(self.bot.executor, ThreadPoolExecutor):
+            # Threads can parse the response while it's still being
+            # downloaded, one chunk at a time.
+            return iter_threadsafe(resp.iter_chunks(), get_running_loop())
+
+        # Processes cannot reach the response, so they get the whole
+        # (compressed) file instead.
+        return (await resp.read(),)
+
+    async def build_rtfm_inventory(
+        self, source: RTFMSource, resp: FetchResponse, timestamp: float
+    ) -> Inventory:
+        page = source.url
+        executor = self.bot.executor
+        loop = get_running_loop()
+
+        # Parsing and indexing tens of thousands of entries can take a
+        # while, so it's done in the bot's executor, so we don't block
+        # the event loop.
+        if source.format == "json":
+            buffer = await resp.read()
+
+            return await loop.run_in_executor(
+                executor, build_json_inventory, buffer, page, timestamp
+            )
 
-    async def build_rtfm_lookup_table(self) -> None:
-        cache: Dict[str, Dict[str, str]] = {}
+        chunks = await self.read_rtfm_chunks(resp)
 
-        for key, page in RTFM_PAGES.items():
-            cache[key] = {}
+        return await loop.run_in_executor(
+            executor, build_sphinx_inventory, chunks, page, timestamp
+        )
 
-            if key == "djs":
-                async with self.bot.session.get(DJS_MANIFEST) as resp:
-                    if resp.status != 200:
-                        raise RuntimeError(
-                            "Cannot build RTFM lookup table, try again later."
-                        )
+    async def update_rtfm_inventory(
+        self,
+        source: RTFMSource,
+        resp: FetchResponse,
+        timestamp: float,
+        current: Inventory,
+    ) -> Tuple[Inventory, InventoryDiff]:
+        page = source.url
+        executor = self.bot.executor
+        loop = get_running_loop()
+
+        # Only parsing needs the executor, indexing is left to the
+        # changes, which are usually a handful of entries.
+        if source.format == "json":
+            buffer = await resp.read()
+            entries = await loop.run_in_executor(
+                executor, read_json_entries, buffer, page
+            )
+        else:
+            chunks = await self.read_rtfm_chunks(resp)
+            entries = await loop.run_in_executor(
+                executor, read_sphinx_entries, chunks, page
+            )
 
-                    data = await resp.json()
-                    # This function can take a while to run, then we'll
-                    # offload it to a thread, so we don't block the
-                    # event loop.
-                    objects = await to_thread(self.parse_objects_json, data)
-                    cache[key] = objects
-            else:
-                async with self.bot.session.get(page + "/objects.inv") as resp:
-                    if resp.status != 200:
-                        raise RuntimeError(
-                            "Cannot build RTFM lookup table, try again later."
-                        )
+        # The current entries may be read from a snapshot, which takes a
+        # while for large sources, so the diff is not computed on the
+        # event loop either.
+        inventory, diff = await to_thread(
+            update_inventory, current, entries, timestamp
+        )
+        rebuilt = " and rebuilt" if inventory.delta is None else ""
 
-                    stream = SphinxObjectFileReader(await resp.read())
-                    cache[key] = self.parse_object_inv(stream, page)
+        log.info(
+            f'Updated{rebuilt} the "{source.key}" RTFM source: {diff} '
+            f"({len(diff)} entries)."
+        )
+        return inventory, diff
+
+    async def load_rtfm_source(self, key: str) -> Inventory:
+        task = self._rtfm_tasks.get(key)
+
+        if task is None:
+            task = create_task(self._load_rtfm_source(key))
+            self._rtfm_tasks[key] = task
+
+        # The load is shared with every other caller waiting on it, so
+        # it must not be cancelled along with one of them.
+        return await shield(task)
+
+    async def _load_rtfm_source(self, key: str) -> Inventory:
+        started = perf_counter()
+
+        try:
+            if key not in self._rtfm_cache:
+                # Sources unloaded earlier, or fetched by another
+                # process, are mapped back from their snapshot instead.
+                await self.reload_rtfm_snapshot(key)
+
+            inventory = self._rtfm_cache.get(key)
+
+            if inventory is None or self.is_rtfm_source_stale(
+                key, inventory, time()
+            ):
+                inventory, diff = await self.fetch_rtfm_source(key)
+                self.set_rtfm_source(key, inventory, started, diff)
+                self.save_rtfm_snapshot(key)
+        finally:
+            del self._rtfm_tasks[key]
+
+        self.evict_rtfm_sources()
+        return inventory
+
+    def save_rtfm_snapshot(self, key: str) -> None:
+        # Writing a snapshot takes a while, so loads finishing in the
+        # meantime are written one after the other by the same task.
+        self._rtfm_dirty.add(key)
+
+        if self._rtfm_snapshot is None:
+            self._rtfm_snapshot = create_task(self._save_rtfm_snapshots())
+
+    async def _save_rtfm_snapshots(self) -> None:
+        try:
+            while self._rtfm_dirty:
+                key = self._rtfm_dirty.pop()
+                inventory = self._rtfm_cache.get(key)
+
+                # The source may have been unloaded in the meantime.
+                if inventory is None:
+                    continue
 
-        self._rtfm_cache = cache
+                try:
+                    await self.write_rtfm_snapshot(key, inventory)
+                except (OSError, RuntimeError):
+                    log.warning(
+                        f'Could not write the snapshot of the "{key}" RTFM '
+                        f"source.",
+                        exc_info=True,
+                    )
+        finally:
+            self._rtfm_snapshot = None
+
+    async def write_rtfm_snapshot(
+        self, key: str, inventory: Inventory
+    ) -> None:
+        path = get_rtfm_snapshot_path(key)
+
+        # Any process of the cluster may write the snapshot of a source
+        # it loaded, and the generation it gets goes up past whichever
+        # was written last, by this process or another one.
+        generation = self._rtfm_generations.get(key, 0) + 1
+
+        makedirs(RTFM_SNAPSHOT_DIR, exist_ok=True)
+        written = await to_thread(
+            dump_snapshot, path, {key: inventory}, generation
+        )
+
+        # The generation written is recorded right away, so the snapshot
+        # isn't reloaded as if another process had written it.
+        self._rtfm_generations[key] = written
+
+        # The freshly built inventory is swapped for its mapped copy, so
+        # this process shares it with the others instead of keeping its
+        # own, unless it was loaded again while the snapshot was being
+        # written.
+        generation, mapped, size = await to_thread(map_rtfm_snapshot, key)
+
+        # Another process replaced the snapshot in the meantime, and its
+        # generation is the one the shard pool finds in the file.
+        if generation != written:
+            log.debug(
+                f'The snapshot of the "{key}" RTFM source was replaced '
+                f"after writing generation {written}, mapping generation "
+                f"{generation} instead."
+            )
+            self._rtfm_generations[key] = generation
+
+        self._rtfm_stats[key].size = size
+        self.share_rtfm_source(key, generation, mapped)
+
+        if self._rtfm_cache.get(key) is inventory:
+            self._rtfm_cache[key] = mapped
+
+        # The size of the source is only known once it's written.
+        self.evict_rtfm_sources()
 
     async def do_rtfm(
         self, ctx: ErisContext, key: str, entity: Optional[str] = None
     ) -> Optional[Message]:
+        source = self.sources.get(key)
+
+        if source is None:
+            return await ctx.reply("This documentation is not available.")
+
         if entity is None:
             return await ctx.reply(
-                f"Click [here]({RTFM_PAGES[key]}) to view the documentation."
+                f"Click [here]({source.url}) to view the documentation."
             )
 
-        if not hasattr(self, "_rtfm_cache"):
-            await ctx.typing()
-            await self.build_rtfm_lookup_table()
+        stages = self._rtfm_stages
+        self.touch_rtfm_source(key)
+
+        with stages.time(key, "normalize"):
+            query = self.normalize_rtfm_entity(key, entity)
+            # Matching ignores case, so queries differing only in case
+            # share the same results.
+            cache_key = (key, query.lower())
+            content = self._rtfm_results.get(cache_key)
+
+        if content is None:
+            inventory = self._rtfm_cache.get(key)
+
+            if inventory is None and self.bot.rtfm_follower and source.preload:
+                await ctx.reply(
+                    "The documentation is still loading, try again in a "
+                    "moment."
+                )
+                return
+
+            if inventory is None:
+                with stages.time(key, "load"):
+                    await ctx.typing()
+                    inventory = await self.load_rtfm_source(key)
+
+            with stages.time(key, "search"):
+                hits = await self.search_rtfm_inventory(
+                    key, inventory, query, limit=8
+                )
+                names = [name for _, _, name in hits]
+                content = self.render_rtfm_results(inventory, query, names)
+                self._rtfm_results.put(cache_key, content)
+
+        with stages.time(key, "reply"):
+            await ctx.reply(content)
+
+    async def do_rtfm_all(self, ctx: ErisContext, entity: str) -> None:
+        stages = self._rtfm_stages
+
+        with stages.time(RTFM_ALL, "normalize"):
+            query = self.normalize_rtfm_entity(RTFM_ALL, entity)
+            cache_key = (RTFM_ALL, query.lower())
+            content = self._rtfm_results.get(cache_key)
+
+        if content is None:
+            # Sources that are not loaded are left out, they're only
+            # loaded once someone asks for them.
+            inventories = dict(self._rtfm_cache)
+
+            if not inventories:
+                await ctx.reply(
+                    "The documentation is still loading, try again in a "
+                    "moment."
+                )
+                return
+
+            with stages.time(RTFM_ALL, "search"):
+                hits = await self.search_rtfm_sources(inventories, entity)
+                content = self.render_rtfm_hits(inventories, hits)
+                self._rtfm_results.put(cache_key, content)
+
+        with stages.time(RTFM_ALL, "reply"):
+            await ctx.reply(content)
+
+    async def search_rtfm_source(
+        self, key: str, inventory: Inventory, entity: str
+    ) -> List[Tuple[int, int, str]]:
+        query = self.normalize_rtfm_entity(key, entity)
+
+        return await self.search_rtfm_inventory(
+            key,
+            inventory,
+            query,
+            limit=RTFM_ALL_LIMIT,
+            timeout=RTFM_ALL_TIMEOUT,
+        )
+
+    async def search_rtfm_inventory(
+        self,
+        key: str,
+        inventory: Inventory,
+        query: str,
+        *,
+        limit: int,
+        timeout: Optional[float] = None,
+    ) -> List[Tuple[int, int, str]]:
+        hits = await self.search_rtfm_shards(
+            key, inventory, query, limit=limit, timeout=timeout
+        )
+
+        if hits is not None:
+            return hits
+
+        search = partial(inventory.search, query, limit=limit, timeout=timeout)
+
+        if len(inventory) < RTFM_SEARCH_INLINE:
+            return search()
+
+        # Fuzzy searches only read the index, prefixes included, and
+        # lookups keep their own reference to it, so it can be searched
+        # from another thread while autocomplete uses it here.
+        return await to_thread(search)
+
+    async def search_rtfm_shards(
+        self,
+        key: str,
+        inventory: Inventory,
+        query: str,
+        *,
+        limit: int,
+        timeout: Optional[float] = None,
+    ) -> Optional[List[Tuple[int, int, str]]]:
+        shared = self._rtfm_shared.get(key)
+
+        if self.shards is None or shared is None:
+            return None
+
+        # The shard pool searches the snapshot the source was mapped
+        # from, which still holds the index of this inventory if it was
+        # only updated since, and the delta is merged in here.
+        generation, index = shared
+
+        if index is not inventory.index:
+            return None
+
+        try:
+            hits = await self.shards.search(
+                get_rtfm_snapshot_path(key),
+                key,
+                generation,
+                len(inventory.table),
+                query,
+                limit=inventory.index_limit(limit),
+                timeout=timeout,
+            )
+        except (BrokenProcessPool, OSError, RuntimeError):
+            log.warning(
+                f'Could not search the "{key}" RTFM source with the shard '
+                f"pool, searching it here instead.",
+                exc_info=True,
+            )
+            return None
+
+        return inventory.merge_hits(query, hits, limit=limit)
+
+    async def search_rtfm_sources(
+        self, inventories: Dict[str, Inventory], entity: str
+    ) -> List[Tuple[int, int, str, str]]:
+        # Every source is searched, as any of them may hold a name tying
+        # with the best ones found elsewhere, and tied names are ranked
+        # by source. Queries that many names start with, which would
+        # benefit from stopping early, are the quickest to search.
+        pending = deque(inventories)
+        hits: List[Tuple[int, int, str, str]] = []
+
+        async def worker() -> None:
+            while pending:
+                key = pending.popleft()
+                found = await self.search_rtfm_source(
+                    key, inventories[key], entity
+                )
+                hits.extend(
+                    (span, start, name, key) for span, start, name in found
+                )
+
+        workers = min(RTFM_ALL_WORKERS, len(pending))
+        await gather(*(worker() for _ in range(workers)))
+
+        # Hits are ranked like finder ranks them within a source, and
+        # ties go to the first name, then to the first source
+        # alphabetically, whichever source answered first.
+        return nsmallest(RTFM_ALL_LIMIT, hits)
+
+    def render_rtfm_hits(
+        self,
+        inventories: Dict[str, Inventory],
+        hits: List[Tuple[int, int, str, str]],
+    ) -> str:
+        if len(hits) == 0:
+            return "Could not find anything. Sorry."
+
+        return "\n".join(
+            f"[`{name}`]({inventories[key][name]}) ({key})"
+            for _, _, name, key in hits
+        )
 
+    def normalize_rtfm_entity(self, key: str, entity: str) -> str:
         entity = re.sub(
             r"^(?:discord\.(?:ext\.)?)?(?:commands\.)?(.+)", r"\1", entity
         )
@@ -224,24 +943,58 @@ class API(Cog):
         if key.startswith("latest"):
             q = entity.lower()
 
-            for name in dir(Messageable):
-                if name[0] == "_":
-                    continue
+            if q in MESSAGEABLE_ATTRIBUTES:
+                entity = f"abc.Messageable.{q}"
 
-                if q == name:
-                    entity = f"abc.Messageable.{name}"
-                    break
+        return entity
 
-        cache = list(self._rtfm_cache[key].items())
-        matches = cast(
-            List[Tuple[str, str]],
-            finder(entity, cache, key=lambda t: t[0])[:8],
-        )
+    def render_rtfm_results(
+        self, inventory: Inventory, query: str, names: List[str]
+    ) -> str:
+        header: List[str] = []
+
+        if len(names) == 0:
+            # Only queries without any match pay for the typo search.
+            names = inventory.suggest(
+                query, limit=8, timeout=RTFM_TYPOS_TIMEOUT
+            )
+            header.append("Could not find anything, did you mean:")
+
+        if len(names) == 0:
+            return "Could not find anything. Sorry."
 
-        if len(matches) == 0:
-            return await ctx.reply("Could not find anything. Sorry.")
+        lines = [f"[`{name}`]({inventory[name]})" for name in names]
 
-        await ctx.reply("\n".join(f"[`{key}`]({url})" for key, url in matches))
+        return "\n".join(header + lines)
+
+    def complete_rtfm_entity(self, key: str, current: str) -> List[str]:
+        inventory = self._rtfm_cache.get(key)
+
+        if inventory is None:
+            # Autocompletion must answer right away, so it doesn't wait
+            # for the source to be loaded.
+            return []
+
+        self._rtfm_cache.move_to_end(key)
+
+        query = self.normalize_rtfm_entity(key, current)
+        names = inventory.complete(query, limit=RTFM_CHOICES)
+
+        if len(names) < RTFM_CHOICES and query:
+            matches = inventory.search(
+                query, limit=RTFM_CHOICES, timeout=RTFM_CHOICES_TIMEOUT
+            )
+            seen = set(names)
+            names += [name for _, _, name in matches if name not in seen]
+
+        choices = [name for name in names if len(name) <= RTFM_CHOICE_LENGTH]
+        return choices[:RTFM_CHOICES]
+
+    def rtfm_choices(self, key: str, current: str) -> List[Choice[str]]:
+        return [
+            Choice(name=name, value=name)
+            for name in self.complete_rtfm_entity(key, current)
+        ]
 
     @hybrid_group(aliases=["rtfd"], fallback="stable")
     @describe(entity="The object to search for.")
@@ -275,6 +1028,135 @@ class API(Cog):
         """Gives you a documentation link for a Python entity."""
         await self.do_rtfm(ctx, "python", entity)
 
+    @rtfm.command(name="docs")
+    @describe(
+        source="The documentation to search.",
+        entity="The object to search for.",
+    )
+    async def rtfm_docs(
+        self, ctx: ErisContext, source: str, *, entity: Optional[str] = None
+    ) -> None:
+        """Gives you a documentation link for an entity of any of the
+        supported documentations.
+        """
+        found = self.sources.resolve(source)
+
+        if found is None:
+            names = ", ".join(f"`{key}`" for key in self.sources)
+            await ctx.reply(f"Unknown documentation, use one of {names}.")
+            return
+
+        await self.do_rtfm(ctx, found.key, entity)
+
+    @rtfm.command(name="all")
+    @describe(entity="The object to search for.")
+    async def rtfm_all(self, ctx: ErisContext, *, entity: str) -> None:
+        """Searches every loaded documentation for an entity."""
+        await self.do_rtfm_all(ctx, entity)
+
+    @rtfm.autocomplete("entity")
+    async def rtfm_autocomplete(
+        self, interaction: Interaction, current: str
+    ) -> List[Choice[str]]:
+        return self.rtfm_choices("stable", current)
+
+    @rtfm_latest.autocomplete("entity")
+    async def rtfm_latest_autocomplete(
+        self, interaction: Interaction, current: str
+    ) -> List[Choice[str]]:
+        return self.rtfm_choices("latest", current)
+
+    @rtfm_djs.autocomplete("entity")
+    async def rtfm_djs_autocomplete(
+        self, interaction: Interaction, current: str
+    ) -> List[Choice[str]]:
+        return self.rtfm_choices("djs", current)
+
+    @rtfm_python.autocomplete("entity")
+    async def rtfm_python_autocomplete(
+        self, interaction: Interaction, current: str
+    ) -> List[Choice[str]]:
+        return self.rtfm_choices("python", current)
+
+    @rtfm_docs.autocomplete("source")
+    async def rtfm_docs_source_autocomplete(
+        self, interaction: Interaction, current: str
+    ) -> List[Choice[str]]:
+        current = current.lower()
+        choices = [
+            Choice(name=f"{source.name} ({key})", value=key)
+            for key, source in self.sources.items()
+            if current in key or current in source.name.lower()
+        ]
+        return choices[:RTFM_CHOICES]
+
+    @rtfm_docs.autocomplete("entity")
+    async def rtfm_docs_autocomplete(
+        self, interaction: Interaction, current: str
+    ) -> List[Choice[str]]:
+        name = getattr(interaction.namespace, "source", None)
+        source = self.sources.resolve(name) if isinstance(name, str) else None
+
+        if source is None:
+            return []
+
+        return self.rtfm_choices(source.key, current)
+
+    @rtfm.command(name="stats", hidden=True, with_app_command=False)
+    @is_owner()
+    async def rtfm_stats(self, ctx: ErisContext) -> None:
+        """Shows statistics about the RTFM result cache."""
+        results = self._rtfm_results
+        lookups = results.hits + results.misses
+        ratio = results.hits / lookups if lookups else 0.0
+
+        await ctx.reply(
+            f"{len(results)}/{results.maxsize} cached results, "
+            f"{results.hits} hits, {results.misses} misses "
+            f"({ratio:.1%} hit rate)."
+        )
+
+    @rtfm.command(name="sources", hidden=True, with_app_command=False)
+    @is_owner()
+    async def rtfm_sources(self, ctx: ErisContext) -> None:
+        """Shows which RTFM sources are loaded, and how often they were
+        loaded and unloaded.
+        """
+        now = time()
+        used = self.get_rtfm_memory_usage() / MEBIBYTE
+        budget = self.sources.memory_budget / MEBIBYTE
+
+        rows = [
+            f"{'source':<12} {'state':<8} {'MiB':>6} {'loads':>5} "
+            f"{'evicted':>7} {'load':>8} {'lookups':>7} last used"
+        ]
+
+        for key in self.sources:
+            stats = self._rtfm_stats[key]
+            state = "loaded" if key in self._rtfm_cache else "-"
+            idle = now - stats.last_used
+            last_used = f"{idle:.0f}s ago" if stats.last_used else "never"
+
+            rows.append(
+                f"{key:<12} {state:<8} {stats.size / MEBIBYTE:>6.1f} "
+                f"{stats.loads:>5} {stats.evictions:>7} "
+                f"{stats.load_time * 1000:>6.0f}ms {stats.lookups:>7} "
+                f"{last_used}"
+            )
+
+        summary = (
+            f"{len(self._rtfm_cache)}/{len(self.sources)} sources loaded, "
+            f"using {used:.1f}/{budget:.0f} MiB."
+        )
+        table = "\n".join(rows)
+
+        if len(summary) + len(table) + 10 <= MESSAGE_LENGTH:
+            await ctx.reply(f"{summary}\n```\n{table}\n```")
+            return
+
+        file = File(BytesIO(table.encode("utf-8")), filename="sources.txt")
+        await ctx.reply(summary, file=file)
+
 
 async def setup(bot: Eris) -> None:
     await bot.add_cog(API(bot))
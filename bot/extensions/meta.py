@@ -15,16 +15,38 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
-from typing import Optional
+from itertools import chain
+from typing import Iterable, List, Optional, Tuple
 from unicodedata import name as get_unicode_name
 
 from discord import Message
-from discord.ext.commands import Cog, hybrid_command  # type: ignore
+from discord.ext.commands import (  # type: ignore
+    Cog,
+    command,
+    hybrid_command,
+    is_owner,
+)
 
 from bot.core import Eris
+from bot.utils.cache_profiles import approximate_size
 from bot.utils.context import ErisContext
 
 
+def get_rss() -> Optional[int]:
+    """Returns the resident memory of the process, in bytes, if it can
+    be read on this platform.
+    """
+    try:
+        with open("/proc/self/status", encoding="utf-8") as file:
+            for line in file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    return None
+
+
 class Meta(Cog):
     """Commands for utilities related to Discord or the bot itself."""
 
@@ -54,6 +76,55 @@ class Meta(Cog):
 
         await ctx.reply(content)
 
+    def get_cache_sizes(self) -> List[Tuple[str, int, int]]:
+        bot = self.bot
+        guilds = bot.guilds
+
+        caches: List[Tuple[str, Iterable[object], int]] = [
+            ("Guilds", guilds, len(guilds)),
+            (
+                "Members",
+                chain.from_iterable(guild.members for guild in guilds),
+                sum(len(guild.members) for guild in guilds),
+            ),
+            ("Users", bot.users, len(bot.users)),
+            (
+                "Channels",
+                chain.from_iterable(guild.channels for guild in guilds),
+                sum(len(guild.channels) for guild in guilds),
+            ),
+            (
+                "Roles",
+                chain.from_iterable(guild.roles for guild in guilds),
+                sum(len(guild.roles) for guild in guilds),
+            ),
+            ("Emojis", bot.emojis, len(bot.emojis)),
+            ("Messages", bot.cached_messages, len(bot.cached_messages)),
+        ]
+
+        return [
+            (name, count, approximate_size(objects, count))
+            for name, objects, count in caches
+        ]
+
+    @command(hidden=True)
+    @is_owner()
+    async def cachestats(self, ctx: ErisContext) -> None:
+        """Shows the size of the caches of the bot."""
+        profile = self.bot.cache_profile
+        lines = [f"Cache profile: {profile.name}"]
+
+        for name, count, size in self.get_cache_sizes():
+            lines.append(f"{name}: {count} (~{size / 1024:.1f} KiB)")
+
+        rss = get_rss()
+
+        if rss is not None:
+            lines.append(f"Resident memory: {rss / 1024 / 1024:.1f} MiB")
+
+        content = "\n".join(lines)
+        await ctx.reply(f"```\n{content}\n```")
+
 
 async def setup(bot: Eris) -> None:
     await bot.add_cog(Meta(bot))
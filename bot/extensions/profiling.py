@@ -0,0 +1,138 @@
+"""
+Copyright (C) 2023  kyomi
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from asyncio import Lock, sleep, to_thread
+from copy import copy
+from cProfile import Profile
+from io import BytesIO
+from threading import get_ident
+from time import perf_counter, time
+
+from discord import File, Message
+from discord.ext.commands import Cog, group, is_owner  # type: ignore
+
+from bot.core import Eris
+from bot.utils.context import ErisContext
+from bot.utils.profiling import AllocationTracer, StackSampler, format_profile
+
+# Longest time, in seconds, the event loop can be sampled for.
+MAX_SAMPLE_DURATION = 300
+
+
+class Profiling(Cog):
+    """Owner-only commands to profile the bot while it's running.
+
+    Nothing is traced or sampled outside of these commands, so they cost
+    nothing while they're not used.
+    """
+
+    __slots__ = ("bot", "_lock")
+
+    def __init__(self, bot: Eris) -> None:
+        self.bot = bot
+        # Profilers are process-wide, so only one can run at a time.
+        self._lock = Lock()
+
+    async def send_report(
+        self, ctx: ErisContext, summary: str, report: str
+    ) -> Message:
+        filename = f"profile-{int(time())}.txt"
+        file = File(BytesIO(report.encode("utf-8")), filename=filename)
+
+        return await ctx.reply(summary, file=file)
+
+    @group(hidden=True, invoke_without_command=True)
+    @is_owner()
+    async def profile(self, ctx: ErisContext, *, command: str) -> None:
+        """Runs a command under cProfile and tracemalloc, and uploads
+        the hottest functions and allocation sites.
+        """
+        message = copy(ctx.message)
+        message.content = f"{ctx.prefix}{command}"
+        new_ctx = await self.bot.get_context(message, cls=type(ctx))
+
+        if new_ctx.command is None:
+            await ctx.reply(f'Command "{command}" not found.')
+            return
+
+        if self._lock.locked():
+            await ctx.reply("A profile is already running.")
+            return
+
+        async with self._lock:
+            tracer = AllocationTracer()
+            profile = Profile()
+
+            # Snapshots of the traced memory, and the reports, take a
+            # while on a busy bot, so they're done in another thread
+            # instead of stalling every shard.
+            await to_thread(tracer.start)
+            started = perf_counter()
+            profile.enable()
+
+            try:
+                await self.bot.invoke(new_ctx)
+            finally:
+                profile.disable()
+                elapsed = perf_counter() - started
+                allocations = await to_thread(tracer.stop)
+
+        # Other tasks running on the event loop while the command awaits
+        # show up in the profile as well.
+        stats = await to_thread(format_profile, profile)
+        report = f"{stats}\n{allocations}"
+        summary = f"`{new_ctx.command}` ran in {elapsed * 1000:.1f}ms."
+
+        await self.send_report(ctx, summary, report)
+
+    @profile.command(name="sample")
+    @is_owner()
+    async def profile_sample(
+        self, ctx: ErisContext, seconds: float = 10.0
+    ) -> None:
+        """Samples the event loop for a number of seconds, and uploads
+        the hottest functions and allocation sites.
+        """
+        seconds = min(max(seconds, 0.1), MAX_SAMPLE_DURATION)
+
+        if self._lock.locked():
+            await ctx.reply("A profile is already running.")
+            return
+
+        async with self._lock:
+            # Every coroutine of the bot runs in this thread.
+            sampler = StackSampler(get_ident())
+            tracer = AllocationTracer()
+
+            await to_thread(tracer.start)
+            sampler.start()
+
+            try:
+                await sleep(seconds)
+            finally:
+                sampler.stop()
+                allocations = await to_thread(tracer.stop)
+
+        samples = await to_thread(sampler.report)
+        report = f"{samples}\n{allocations}"
+        summary = f"Sampled the event loop for {seconds:g}s."
+
+        await self.send_report(ctx, summary, report)
+
+
+async def setup(bot: Eris) -> None:
+    await bot.add_cog(Profiling(bot))
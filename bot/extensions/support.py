@@ -15,7 +15,17 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
-from typing import Any, List, Mapping, Optional
+from typing import (
+    Any,
+    Dict,
+    FrozenSet,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    cast,
+)
 
 from discord.ext.commands import (  # type: ignore
     Cog,
@@ -25,12 +35,189 @@ from discord.ext.commands import (  # type: ignore
 )
 
 from bot.core import Eris
+from bot.utils.cache import ResultCache
 from bot.utils.embed import create_embed
 
 BOOKMARK_TABS_EMOJI = "\U0001f4d1"
 SILHOUETTE_EMOJI = "\U0001f465"
 PIN_EMOJI = "\U0001f4cc"
 
+# How many sets of visible commands are kept around, and for how long
+# (in seconds). Each is keyed by guild and permissions, so a change of
+# permissions is picked up right away, and the TTL only bounds how long
+# other changes to the result of checks go unnoticed.
+HELP_VISIBLE_SIZE = 1024
+HELP_VISIBLE_TTL = 10 * 60
+
+
+class HelpEntry:
+    """The rendered help of a cog, group or command.
+
+    Parameters
+    ----------
+    title: :class:`str`
+        The title of the embed.
+    description: Optional[:class:`str`]
+        The description of the embed.
+    fields: List[Tuple[:class:`str`, :class:`str`]]
+        The names and values of the fields of the embed.
+    commands: List[Tuple[:class:`str`, :class:`str`]]
+        The qualified names and the rendered names of the commands of
+        a cog, sorted by name, which are only listed if visible.
+    """
+
+    __slots__ = ("title", "description", "fields", "commands")
+
+    def __init__(
+        self,
+        title: str,
+        description: Optional[str],
+        fields: Optional[List[Tuple[str, str]]] = None,
+        commands: Optional[List[Tuple[str, str]]] = None,
+    ) -> None:
+        self.title = title
+        self.description = description
+        self.fields = fields or []
+        self.commands = commands or []
+
+    def listing(self, visible: FrozenSet[str]) -> str:
+        """Returns the commands of the entry that are visible, separated
+        by commas.
+        """
+        return ", ".join(
+            rendered for name, rendered in self.commands if name in visible
+        )
+
+
+def _names(names: Sequence[str]) -> str:
+    return ", ".join(f"`{name}`" for name in names)
+
+
+class HelpCatalog:
+    """The help of every cog, group and command, rendered once and kept
+    until an extension is loaded, unloaded or reloaded.
+
+    Only which commands are visible depends on who asks for help, and
+    that is cached per guild and set of permissions.
+
+    Attributes
+    ----------
+    version: :class:`int`
+        The :attr:`Eris.extensions_version` the catalog was built for.
+    prefix: :class:`str`
+        The prefix the signatures were rendered with.
+    usage: :class:`str`
+        The signature of the help command.
+    cogs: Dict[:class:`str`, :class:`HelpEntry`]
+        The help of every cog, keyed by name, in the order of the cogs
+        of the bot.
+    entries: Dict[:class:`str`, :class:`HelpEntry`]
+        The help of every command, keyed by qualified name.
+    """
+
+    __slots__ = ("version", "prefix", "usage", "cogs", "entries", "_visible")
+
+    def __init__(self) -> None:
+        self.version = -1
+        self.prefix = ""
+        self.usage = ""
+        self.cogs: Dict[str, HelpEntry] = {}
+        self.entries: Dict[str, HelpEntry] = {}
+        # Qualified names of the visible top-level commands, keyed by
+        # guild, permissions and whether the author owns the bot.
+        self._visible: ResultCache[
+            Tuple[Optional[int], int, bool], FrozenSet[str]
+        ] = ResultCache(HELP_VISIBLE_SIZE, HELP_VISIBLE_TTL)
+
+    def update(self, help: "Help") -> None:
+        """Builds the catalog again, if the extensions changed since it
+        was built or the help command is invoked with another prefix.
+
+        Parameters
+        ----------
+        help: :class:`Help`
+            The help command being invoked.
+        """
+        bot = cast(Eris, help.context.bot)
+        prefix = help.context.clean_prefix
+
+        if (bot.extensions_version, prefix) == (self.version, self.prefix):
+            return
+
+        self.version = bot.extensions_version
+        self.prefix = prefix
+        impl = help._command_impl  # type: ignore
+        self.usage = help.get_command_signature(impl)
+        self.cogs = {
+            name: self.render_cog(cog) for name, cog in bot.cogs.items()
+        }
+        self.entries = {
+            command.qualified_name: self.render_command(help, command)
+            for command in bot.walk_commands()
+        }
+        self._visible.clear()
+
+    def render_cog(self, cog: Cog) -> HelpEntry:
+        commands = sorted(cog.get_commands(), key=lambda c: c.name)
+
+        return HelpEntry(
+            f"{BOOKMARK_TABS_EMOJI} `{self.usage}`",
+            cog.description,
+            commands=[(c.qualified_name, f"`{c.name}`") for c in commands],
+        )
+
+    def render_command(
+        self, help: "Help", command: Command[Any, ..., Any]
+    ) -> HelpEntry:
+        cmd = help.get_command_signature(command)
+        entry = HelpEntry(f"{BOOKMARK_TABS_EMOJI} `{cmd}`", command.help)
+
+        if isinstance(command, Group):
+            if command.aliases:
+                name = f"{SILHOUETTE_EMOJI} Aliases"
+                entry.fields.append((name, _names(command.aliases)))
+
+            if command.commands:
+                name = "\U0001f4cc Subcommands"
+                names = sorted(c.name for c in command.commands)
+                entry.fields.append((name, _names(names)))
+        elif command.aliases:
+            name = f"{PIN_EMOJI} Aliases"
+            entry.fields.append((name, _names(command.aliases)))
+
+        return entry
+
+    def get_entry(
+        self, help: "Help", command: Command[Any, ..., Any]
+    ) -> HelpEntry:
+        """Returns the help of a command, rendering it if the command
+        was added outside of an extension.
+        """
+        entry = self.entries.get(command.qualified_name)
+
+        if entry is None:
+            entry = self.render_command(help, command)
+            self.entries[command.qualified_name] = entry
+
+        return entry
+
+    async def get_visible(self, help: "Help") -> FrozenSet[str]:
+        """Returns the qualified names of the top-level commands the
+        author of the help command can see.
+        """
+        ctx = help.context
+        guild = ctx.guild.id if ctx.guild is not None else None
+        owner: bool = await ctx.bot.is_owner(ctx.author)
+        key = (guild, ctx.permissions.value, owner)
+        visible = self._visible.get(key)
+
+        if visible is None:
+            commands = await help.filter_commands(ctx.bot.commands)
+            visible = frozenset(c.qualified_name for c in commands)
+            self._visible.put(key, visible)
+
+        return visible
+
 
 class Help(HelpCommand):
     """A custom help command."""
@@ -41,6 +228,14 @@ class Help(HelpCommand):
         super().__init__(**options)
         self.command_attrs["help"] = "Shows this message."
 
+    def get_catalog(self) -> HelpCatalog:
+        # The help command is copied on every invocation, so the catalog
+        # is kept by the cog instead.
+        catalog = cast(Support, self.cog).catalog
+        catalog.update(self)
+
+        return catalog
+
     async def send_error_message(self, error: str) -> None:
         ctx = self.context
         embed = create_embed(error, author=ctx.author)
@@ -51,78 +246,54 @@ class Help(HelpCommand):
         self, mapping: Mapping[Optional[Cog], List[Command[Any, ..., Any]]]
     ) -> None:
         ctx = self.context
-        cmd = self.get_command_signature(self._command_impl)
+        catalog = self.get_catalog()
+        visible = await catalog.get_visible(self)
 
-        content = f"Use `{cmd}` to get help on a command."
+        content = f"Use `{catalog.usage}` to get help on a command."
         embed = create_embed(content, author=ctx.author)
 
-        for cog, commands in mapping.items():
-            filtered = await self.filter_commands(commands, sort=True)
-
-            if cog is None or not filtered:
-                continue
+        for name, entry in catalog.cogs.items():
+            commands = entry.listing(visible)
 
-            name = cog.qualified_name
-            commands = [f"`{command.name}`" for command in filtered]
-
-            embed.add_field(name=name, value=", ".join(commands), inline=False)
+            if commands:
+                embed.add_field(name=name, value=commands, inline=False)
 
         await ctx.reply(embed=embed)
 
     async def send_cog_help(self, cog: Cog) -> None:
         ctx = self.context
-        embed = create_embed(cog.description, author=ctx.author)
-
-        cmd = self.get_command_signature(self._command_impl)
-        embed.title = f"{BOOKMARK_TABS_EMOJI} `{cmd}`"
+        catalog = self.get_catalog()
+        entry = catalog.cogs.get(cog.qualified_name) or catalog.render_cog(cog)
+        visible = await catalog.get_visible(self)
 
-        filtered = await self.filter_commands(cog.get_commands(), sort=True)
+        embed = create_embed(entry.description, author=ctx.author)
+        embed.title = entry.title
+        commands = entry.listing(visible)
 
-        if filtered:
-            commands = [f"`{command.name}`" for command in filtered]
+        if commands:
             embed.add_field(
                 name="\U0001f4cc Commands",
-                value=", ".join(commands),
+                value=commands,
                 inline=False,
             )
 
         await ctx.reply(embed=embed)
 
     async def send_group_help(self, group: Group[Any, ..., Any]) -> None:
-        ctx = self.context
-        embed = create_embed(group.help, author=ctx.author)
-
-        cmd = self.get_command_signature(group)
-        embed.title = f"{BOOKMARK_TABS_EMOJI} `{cmd}`"
-
-        if group.aliases:
-            name = f"{SILHOUETTE_EMOJI} Aliases"
-            aliases = ", ".join(f"`{alias}`" for alias in group.aliases)
-
-            embed.add_field(name=name, value=aliases, inline=False)
-
-        if group.commands:
-            name = "\U0001f4cc Subcommands"
-            commands = ", ".join(
-                f"`{command.name}`" for command in group.commands
-            )
-
-            embed.add_field(name=name, value=commands, inline=False)
-
-        await ctx.reply(embed=embed)
+        await self.send_entry(group)
 
     async def send_command_help(self, command: Command[Any, ..., Any]) -> None:
-        ctx = self.context
-        embed = create_embed(command.help, author=ctx.author)
+        await self.send_entry(command)
 
-        cmd = self.get_command_signature(command)
-        embed.title = f"{BOOKMARK_TABS_EMOJI} `{cmd}`"
+    async def send_entry(self, command: Command[Any, ..., Any]) -> None:
+        ctx = self.context
+        entry = self.get_catalog().get_entry(self, command)
 
-        if command.aliases:
-            name = f"{PIN_EMOJI} Aliases"
-            aliases = ", ".join(f"`{alias}`" for alias in command.aliases)
+        embed = create_embed(entry.description, author=ctx.author)
+        embed.title = entry.title
 
-            embed.add_field(name=name, value=aliases, inline=False)
+        for name, value in entry.fields:
+            embed.add_field(name=name, value=value, inline=False)
 
         await ctx.reply(embed=embed)
 
@@ -130,11 +301,12 @@ class Help(HelpCommand):
 class Support(Cog):
     """Commands related to user support."""
 
-    __slots__ = ("bot", "original_help_command")
+    __slots__ = ("bot", "original_help_command", "catalog")
 
     def __init__(self, bot: Eris) -> None:
         self.bot = bot
         self.original_help_command = bot.help_command
+        self.catalog = HelpCatalog()
 
         bot.help_command = Help()
         bot.help_command.cog = self
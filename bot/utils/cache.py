@@ -0,0 +1,127 @@
+"""
+Copyright (C) 2023  kyomi
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from collections import OrderedDict
+from time import monotonic
+from typing import Callable, Generic, Hashable, Optional, Tuple, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class ResultCache(Generic[K, V]):
+    """A bounded least-recently-used cache whose entries expire after a
+    while.
+
+    Parameters
+    ----------
+    maxsize: :class:`int`
+        The maximum number of entries to keep. The least recently used
+        entry is evicted to make room for new ones.
+    ttl: :class:`float`
+        How long, in seconds, an entry stays valid after being stored.
+
+    Attributes
+    ----------
+    hits: :class:`int`
+        The number of lookups that found a valid entry.
+    misses: :class:`int`
+        The number of lookups that did not.
+    """
+
+    __slots__ = ("maxsize", "ttl", "hits", "misses", "_entries")
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+        self.hits = 0
+        self.misses = 0
+
+        self._entries: OrderedDict[K, Tuple[float, V]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: K) -> Optional[V]:
+        """Returns the entry stored under the given key, or ``None`` if
+        there is none or it expired.
+        """
+        entry = self._entries.get(key)
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires, value = entry
+
+        if expires <= monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+
+        return value
+
+    def put(self, key: K, value: V) -> None:
+        """Stores an entry under the given key."""
+        self._entries[key] = (monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, predicate: Callable[[K], bool]) -> int:
+        """Removes every entry whose key matches the given predicate.
+
+        Returns
+        -------
+        :class:`int`
+            The number of removed entries.
+        """
+        keys = [key for key in self._entries if predicate(key)]
+
+        for key in keys:
+            del self._entries[key]
+
+        return len(keys)
+
+    def invalidate_items(self, predicate: Callable[[K, V], bool]) -> int:
+        """Removes every entry whose key and value match the given
+        predicate, expired or not.
+
+        Returns
+        -------
+        :class:`int`
+            The number of removed entries.
+        """
+        keys = [
+            key
+            for key, (_, value) in self._entries.items()
+            if predicate(key, value)
+        ]
+
+        for key in keys:
+            del self._entries[key]
+
+        return len(keys)
+
+    def clear(self) -> None:
+        """Removes every entry."""
+        self._entries.clear()
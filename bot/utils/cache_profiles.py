@@ -0,0 +1,174 @@
+"""
+Copyright (C) 2023  kyomi
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from itertools import islice
+from sys import getsizeof
+from typing import Iterable, Optional
+
+from discord import Intents, MemberCacheFlags
+
+
+class CacheProfile:
+    """The gateway intents and cache settings of the bot, which decide
+    most of its memory usage.
+
+    Parameters
+    ----------
+    name: :class:`str`
+        The name of the profile.
+    intents: :class:`discord.Intents`
+        The gateway intents to request.
+    member_cache_flags: :class:`discord.MemberCacheFlags`
+        Which members to keep in the cache.
+    chunk_guilds_at_startup: :class:`bool`
+        Whether to request every member of every guild at startup.
+    max_messages: Optional[:class:`int`]
+        How many messages to keep in the cache, or ``None`` to not
+        cache messages at all.
+    """
+
+    __slots__ = (
+        "name",
+        "intents",
+        "member_cache_flags",
+        "chunk_guilds_at_startup",
+        "max_messages",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        intents: Intents,
+        member_cache_flags: MemberCacheFlags,
+        chunk_guilds_at_startup: bool,
+        max_messages: Optional[int],
+    ) -> None:
+        self.name = name
+        self.intents = intents
+        self.member_cache_flags = member_cache_flags
+        self.chunk_guilds_at_startup = chunk_guilds_at_startup
+        self.max_messages = max_messages
+
+
+def _minimal_profile() -> CacheProfile:
+    # Just enough for prefix commands and interactions.
+    intents = Intents.none()
+    intents.guilds = True
+    intents.guild_messages = True
+    intents.dm_messages = True
+    intents.message_content = True
+
+    return CacheProfile(
+        "minimal", intents, MemberCacheFlags.none(), False, None
+    )
+
+
+def _standard_profile() -> CacheProfile:
+    # Everything but the privileged member and presence intents.
+    intents = Intents.default()
+    intents.message_content = True
+
+    flags = MemberCacheFlags.from_intents(intents)
+    return CacheProfile("standard", intents, flags, False, 1000)
+
+
+def _full_profile() -> CacheProfile:
+    intents = Intents.all()
+    flags = MemberCacheFlags.all()
+
+    return CacheProfile("full", intents, flags, True, 1000)
+
+
+CACHE_PROFILES = {
+    "minimal": _minimal_profile,
+    "standard": _standard_profile,
+    "full": _full_profile,
+}
+
+
+def get_cache_profile(name: str) -> CacheProfile:
+    """Returns the cache profile with the given name.
+
+    Parameters
+    ----------
+    name: :class:`str`
+        The name of the profile, one of :data:`CACHE_PROFILES`.
+
+    Returns
+    -------
+    :class:`CacheProfile`
+        The cache profile.
+
+    Raises
+    ------
+    ValueError
+        There is no cache profile with the given name.
+    """
+    factory = CACHE_PROFILES.get(name)
+
+    if factory is None:
+        choices = ", ".join(CACHE_PROFILES)
+        raise ValueError(f'Invalid cache profile "{name}", use {choices}.')
+
+    return factory()
+
+
+def _shallow_size(obj: object) -> int:
+    # The object itself, plus whatever its slots point to, which is
+    # where discord.py models keep their data.
+    size = getsizeof(obj)
+
+    for cls in type(obj).__mro__:
+        for slot in getattr(cls, "__slots__", ()):
+            value = getattr(obj, slot, None)
+
+            if value is not None:
+                size += getsizeof(value)
+
+    return size
+
+
+def approximate_size(
+    objects: Iterable[object], count: int, sample: int = 100
+) -> int:
+    """Estimates how many bytes a collection of objects takes, from the
+    average size of the first few of them.
+
+    Values shared between objects are counted once per object, and
+    nested containers are not followed, so this is only meant to
+    compare caches with each other.
+
+    Parameters
+    ----------
+    objects: Iterable[:class:`object`]
+        The objects to measure.
+    count: :class:`int`
+        How many objects there are.
+    sample: :class:`int`
+        How many objects to measure at most.
+
+    Returns
+    -------
+    :class:`int`
+        The estimated size, in bytes.
+    """
+    sizes = [_shallow_size(obj) for obj in islice(objects, sample)]
+
+    if not sizes:
+        return 0
+
+    return sum(sizes) * count // len(sizes)
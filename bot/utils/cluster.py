@@ -0,0 +1,473 @@
+"""
+Copyright (C) 2023  kyomi
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import asyncio
+from asyncio import Event, create_task, gather, get_running_loop, to_thread
+from logging import getLogger
+from multiprocessing import get_context
+from multiprocessing.process import BaseProcess
+from os import environ
+from signal import SIG_IGN, SIGINT, SIGTERM, signal
+from time import monotonic
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiohttp import ClientError, ClientSession, ClientTimeout
+
+from bot.utils.metrics import MetricsRegistry, MetricsServer, merge_metrics
+
+log = getLogger(__name__)
+
+GATEWAY_URL = "https://discord.com/api/v10/gateway/bot"
+
+# Workers that exit are restarted with an exponential backoff, starting
+# at the first delay and capped at the second one (in seconds). Workers
+# that ran for longer than the last delay are restarted right away.
+RESTART_DELAYS = (1, 60)
+
+# How long (in seconds) workers get to close before they are killed.
+STOP_TIMEOUT = 30
+
+# How long (in seconds) the supervisor waits for the metrics and health
+# check of a worker.
+SCRAPE_TIMEOUT = 5
+
+
+class WorkerConfig:
+    """What a worker process of the cluster runs. This is pickled and
+    sent to the worker when it's spawned.
+
+    Parameters
+    ----------
+    index: :class:`int`
+        The index of the worker in the cluster.
+    shard_ids: List[:class:`int`]
+        The shards the worker runs.
+    shard_count: :class:`int`
+        The total number of shards, across every worker.
+    metrics_port: Optional[:class:`int`]
+        The port the worker serves its metrics on, if any.
+    log_format: :class:`str`
+        The format of the log file of the worker.
+    defer_extensions: :class:`bool`
+        Whether to load extensions not needed to answer users once the
+        worker is ready.
+    """
+
+    __slots__ = (
+        "index",
+        "shard_ids",
+        "shard_count",
+        "metrics_port",
+        "log_format",
+        "defer_extensions",
+    )
+
+    def __init__(
+        self,
+        index: int,
+        shard_ids: List[int],
+        shard_count: int,
+        metrics_port: Optional[int],
+        log_format: str,
+        defer_extensions: bool,
+    ) -> None:
+        self.index = index
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.metrics_port = metrics_port
+        self.log_format = log_format
+        self.defer_extensions = defer_extensions
+
+
+async def _run_worker(config: WorkerConfig) -> None:
+    from bot.core import Eris
+    from bot.utils.startup import StartupTimer
+
+    # Only the first worker fetches the RTFM sources, the others reload
+    # the snapshot it writes, so the docs are downloaded and parsed once
+    # for the whole cluster.
+    async with Eris(
+        metrics_port=config.metrics_port,
+        startup=StartupTimer(),
+        defer_extensions=config.defer_extensions,
+        shard_ids=config.shard_ids,
+        shard_count=config.shard_count,
+        rtfm_follower=config.index != 0,
+    ) as bot:
+        try:
+            get_running_loop().add_signal_handler(
+                SIGTERM, lambda: create_task(bot.close())
+            )
+        except NotImplementedError:
+            pass
+
+        await bot.start(environ["DISCORD_TOKEN"])
+
+
+def run_worker(config: WorkerConfig) -> None:
+    """Runs a worker of the cluster, until it's told to stop with
+    ``SIGTERM``. This is the target of the worker processes.
+    """
+    from dotenv import load_dotenv
+
+    from bot.utils.logs import setup_logging
+
+    # An empty list would have the worker run every shard of the bot.
+    if not config.shard_ids:
+        raise ValueError(f"Worker {config.index} was given no shards.")
+
+    # Interrupting the terminal reaches every process, but only the
+    # supervisor should act on it, and stop the workers in order.
+    signal(SIGINT, SIG_IGN)
+    load_dotenv("config/.env")
+
+    with setup_logging(config.log_format, f"eris-worker-{config.index}"):
+        asyncio.run(_run_worker(config))
+
+
+async def fetch_recommended_shards(session: ClientSession, token: str) -> int:
+    """Returns the number of shards Discord recommends for the bot."""
+    headers = {"Authorization": f"Bot {token}"}
+
+    async with session.get(GATEWAY_URL, headers=headers) as resp:
+        resp.raise_for_status()
+        data = await resp.json()
+
+    return int(data["shards"])
+
+
+class _Worker:
+    __slots__ = (
+        "config",
+        "process",
+        "started",
+        "restarts",
+        "failures",
+        "restart_at",
+    )
+
+    def __init__(self, config: WorkerConfig) -> None:
+        self.config = config
+        self.process: Optional[BaseProcess] = None
+        self.started = 0.0
+        self.restarts = 0
+        # Number of consecutive early exits, and when to restart.
+        self.failures = 0
+        self.restart_at = 0.0
+
+
+class ClusterMetricsServer(MetricsServer):
+    """Serves the metrics and health checks of every worker of a
+    :class:`ClusterSupervisor`, along with its own.
+    """
+
+    __slots__ = ("supervisor",)
+
+    def __init__(self, supervisor: "ClusterSupervisor", port: int) -> None:
+        super().__init__(supervisor.metrics, port=port)
+        self.supervisor = supervisor
+
+    async def scrape(self, port: int, path: str) -> Optional[Any]:
+        session = self.supervisor.session
+        assert session is not None
+
+        url = f"http://127.0.0.1:{port}{path}"
+        timeout = ClientTimeout(total=SCRAPE_TIMEOUT)
+
+        try:
+            async with session.get(url, timeout=timeout) as resp:
+                resp.raise_for_status()
+
+                if path == "/health":
+                    return await resp.json()
+
+                return await resp.text()
+        except (ClientError, asyncio.TimeoutError):
+            return None
+
+    async def scrape_workers(self, path: str) -> Dict[str, Any]:
+        ports: List[Tuple[str, int]] = [
+            (str(w.config.index), w.config.metrics_port)
+            for w in self.supervisor.workers
+            if w.config.metrics_port is not None
+        ]
+        results = await gather(*(self.scrape(p, path) for _, p in ports))
+
+        return {key: result for (key, _), result in zip(ports, results)}
+
+    async def collect(self) -> str:
+        texts = await self.scrape_workers("/metrics")
+        sources = {key: text for key, text in texts.items() if text}
+
+        # Workers that could not be reached are left out, the supervisor
+        # metrics tell which ones are down.
+        return self.registry.render() + merge_metrics("worker", sources)
+
+    async def check_health(self) -> Dict[str, Any]:
+        checks = await self.scrape_workers("/health")
+        workers: Dict[str, Any] = {}
+
+        for worker in self.supervisor.workers:
+            key = str(worker.config.index)
+            process = worker.process
+
+            workers[key] = {
+                "alive": process is not None and process.is_alive(),
+                "pid": process.pid if process is not None else None,
+                "restarts": worker.restarts,
+                "shards": worker.config.shard_ids,
+                "health": checks.get(key),
+            }
+
+        ready = bool(checks) and all(
+            check is not None and check.get("ready") is True
+            for check in checks.values()
+        )
+        return {"ready": ready, "workers": workers}
+
+
+class ClusterSupervisor:
+    """Runs the bot in several processes, each running a subset of its
+    shards, and restarts the processes that exit.
+
+    Parameters
+    ----------
+    workers: :class:`int`
+        The maximum number of worker processes. Only as many workers as
+        there are shards are started.
+    shard_count: Optional[:class:`int`]
+        The total number of shards. Defaults to ``None``, which uses
+        the number recommended by Discord.
+    metrics_port: Optional[:class:`int`]
+        The port to serve the metrics and health checks of the whole
+        cluster on, if any. Workers serve theirs on the following
+        ports, one each.
+    log_format: :class:`str`
+        The format of the log files of the workers.
+    defer_extensions: :class:`bool`
+        Whether workers load extensions not needed to answer users once
+        they're ready.
+    """
+
+    __slots__ = (
+        "worker_count",
+        "shard_count",
+        "metrics_port",
+        "log_format",
+        "defer_extensions",
+        "workers",
+        "metrics",
+        "session",
+        "_restarts",
+        "_stopping",
+    )
+
+    def __init__(
+        self,
+        workers: int,
+        shard_count: Optional[int] = None,
+        *,
+        metrics_port: Optional[int] = None,
+        log_format: str = "text",
+        defer_extensions: bool = True,
+    ) -> None:
+        if workers < 1:
+            raise ValueError("A cluster needs at least one worker.")
+
+        if shard_count is not None and shard_count < 1:
+            raise ValueError("A cluster needs at least one shard.")
+
+        self.worker_count = workers
+        self.shard_count = shard_count
+        self.metrics_port = metrics_port
+        self.log_format = log_format
+        self.defer_extensions = defer_extensions
+
+        self.workers: List[_Worker] = []
+        self.session: Optional[ClientSession] = None
+        self._stopping = Event()
+
+        self.metrics = MetricsRegistry()
+        self._restarts = self.metrics.counter(
+            "eris_cluster_restarts_total",
+            "Number of times each worker was restarted.",
+            ("worker",),
+        )
+        self.metrics.callback(
+            "eris_cluster_workers_alive",
+            "Number of worker processes running.",
+            lambda: sum(
+                1
+                for w in self.workers
+                if w.process is not None and w.process.is_alive()
+            ),
+        )
+
+    def create_configs(self, shard_count: int) -> List[WorkerConfig]:
+        configs: List[WorkerConfig] = []
+        port = self.metrics_port
+        # A worker without shards would run every shard, as an empty
+        # list of shards means all of them to discord.py, so there are
+        # never more workers than shards.
+        workers = min(self.worker_count, shard_count)
+
+        for index in range(workers):
+            configs.append(
+                WorkerConfig(
+                    index,
+                    # Shards are spread evenly, and consecutive shards
+                    # land on different workers.
+                    list(range(index, shard_count, workers)),
+                    shard_count,
+                    port + 1 + index if port is not None else None,
+                    self.log_format,
+                    self.defer_extensions,
+                )
+            )
+
+        return configs
+
+    def spawn(self, worker: _Worker) -> None:
+        # Workers start from a fresh interpreter, instead of a fork of
+        # the supervisor and its event loop.
+        process = get_context("spawn").Process(
+            target=run_worker,
+            args=(worker.config,),
+            name=f"eris-worker-{worker.config.index}",
+        )
+        process.start()
+
+        worker.process = process
+        worker.started = monotonic()
+
+        config = worker.config
+        log.info(
+            f"Started worker {config.index} (pid {process.pid}) with "
+            f"shards {config.shard_ids}."
+        )
+
+    def check_worker(self, worker: _Worker, now: float) -> None:
+        process = worker.process
+
+        if process is not None and process.is_alive():
+            return
+
+        index = worker.config.index
+
+        if process is not None:
+            # Workers running for a while are restarted right away, as
+            # their exit is not likely to happen again at once.
+            first, last = RESTART_DELAYS
+
+            if now - worker.started >= last:
+                worker.failures = 0
+
+            delay = min(first * 2**worker.failures, last)
+            worker.failures += 1
+            worker.restarts += 1
+            worker.restart_at = now + delay
+            worker.process = None
+
+            self._restarts.inc(str(index))
+            log.warning(
+                f"Worker {index} exited with code {process.exitcode}, "
+                f"restarting in {delay} seconds."
+            )
+
+        if now >= worker.restart_at:
+            self.spawn(worker)
+
+    async def supervise(self) -> None:
+        while not self._stopping.is_set():
+            now = monotonic()
+
+            for worker in self.workers:
+                self.check_worker(worker, now)
+
+            try:
+                await asyncio.wait_for(self._stopping.wait(), 1)
+            except asyncio.TimeoutError:
+                pass
+
+    def stop(self) -> None:
+        """Tells the supervisor to stop every worker and return."""
+        self._stopping.set()
+
+    async def stop_workers(self) -> None:
+        processes = [w.process for w in self.workers if w.process]
+
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+        def join(process: BaseProcess) -> None:
+            process.join(STOP_TIMEOUT)
+
+            if process.is_alive():
+                log.warning(f"Killing worker {process.name}.")
+                process.kill()
+                process.join()
+
+        await gather(*(to_thread(join, process) for process in processes))
+
+    async def get_shard_count(self, session: ClientSession) -> int:
+        if self.shard_count is not None:
+            return self.shard_count
+
+        token = environ["DISCORD_TOKEN"]
+        return await fetch_recommended_shards(session, token)
+
+    async def run(self) -> None:
+        """Runs the cluster until :meth:`stop` is called, or the
+        supervisor receives ``SIGINT`` or ``SIGTERM``.
+        """
+        loop = get_running_loop()
+
+        for sig in (SIGINT, SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+            except NotImplementedError:
+                pass
+
+        async with ClientSession() as session:
+            self.session = session
+            shard_count = await self.get_shard_count(session)
+
+            self.workers = [
+                _Worker(config) for config in self.create_configs(shard_count)
+            ]
+            log.info(
+                f"Starting {len(self.workers)} workers for {shard_count} "
+                "shards."
+            )
+
+            server: Optional[ClusterMetricsServer] = None
+
+            if self.metrics_port is not None:
+                server = ClusterMetricsServer(self, self.metrics_port)
+                await server.start()
+
+            try:
+                await self.supervise()
+            finally:
+                log.info("Stopping workers.")
+                await self.stop_workers()
+
+                if server is not None:
+                    await server.stop()
+
+            self.session = None
@@ -31,6 +31,9 @@ else:
 class ErisContext(commands.Context[Eris]):
     """Custom context class."""
 
+    # When the command started running, see :meth:`Eris.before_command`.
+    invoked_at: Optional[float] = None
+
     async def reply(
         self, content: Optional[str] = None, **kwargs: Any
     ) -> Message:
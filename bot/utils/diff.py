@@ -0,0 +1,192 @@
+"""
+Copyright (C) 2023  kyomi
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from typing import (
+    AbstractSet,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from bot.utils.fuzzy import FuzzyIndex
+from bot.utils.prefix import PrefixIndex
+from bot.utils.typo import TypoIndex
+
+
+class InventoryDiff:
+    """The entries added, removed and changed between two versions of
+    an inventory.
+
+    Parameters
+    ----------
+    added: Dict[:class:`str`, :class:`str`]
+        The URLs of the new entries, keyed by name.
+    removed: List[:class:`str`]
+        The names of the entries that are gone.
+    changed: Dict[:class:`str`, :class:`str`]
+        The new URLs of the entries whose URL changed, keyed by name.
+    """
+
+    __slots__ = ("added", "removed", "changed")
+
+    def __init__(
+        self,
+        added: Optional[Dict[str, str]] = None,
+        removed: Optional[List[str]] = None,
+        changed: Optional[Dict[str, str]] = None,
+    ) -> None:
+        self.added = added or {}
+        self.removed = removed or []
+        self.changed = changed or {}
+
+    @classmethod
+    def compute(
+        cls, current: Iterable[Tuple[str, str]], entries: Mapping[str, str]
+    ) -> "InventoryDiff":
+        """Compares the entries of an inventory with new ones.
+
+        Parameters
+        ----------
+        current: Iterable[Tuple[:class:`str`, :class:`str`]]
+            The current entries, as name and URL pairs sorted by name,
+            see :meth:`Inventory.entries`.
+        entries: Mapping[:class:`str`, :class:`str`]
+            The new entries, mapping names to URLs.
+
+        Returns
+        -------
+        :class:`InventoryDiff`
+            What changed from ``current`` to ``entries``.
+        """
+        diff = cls()
+        names = sorted(entries)
+        i = 0
+
+        # Both sides are sorted, so they're walked side by side instead
+        # of looking every name up in the other one.
+        for name, url in current:
+            while i < len(names) and names[i] < name:
+                diff.added[names[i]] = entries[names[i]]
+                i += 1
+
+            if i < len(names) and names[i] == name:
+                if entries[name] != url:
+                    diff.changed[name] = entries[name]
+
+                i += 1
+            else:
+                diff.removed.append(name)
+
+        for name in names[i:]:
+            diff.added[name] = entries[name]
+
+        return diff
+
+    def __len__(self) -> int:
+        return len(self.added) + len(self.removed) + len(self.changed)
+
+    def __str__(self) -> str:
+        return (
+            f"{len(self.added)} added, {len(self.removed)} removed, "
+            f"{len(self.changed)} changed"
+        )
+
+    @property
+    def stale(self) -> List[str]:
+        """The names whose URL, if shown anywhere, is not valid
+        anymore.
+        """
+        return self.removed + list(self.changed)
+
+
+class InventoryDelta:
+    """The entries of an inventory that changed since its indexes were
+    built, with small indexes of their own over the added names.
+
+    Searches go through both the full indexes, skipping the removed
+    names, and the indexes of the delta, so applying a change costs
+    about the size of the change instead of a full rebuild.
+
+    Parameters
+    ----------
+    urls: Dict[:class:`str`, :class:`str`]
+        The URLs of the added entries and the new URLs of the changed
+        ones, keyed by name.
+    removed: AbstractSet[:class:`str`]
+        The names of the indexed entries that are gone.
+    names: Sequence[:class:`str`]
+        The sorted names of the entries that are not indexed.
+    """
+
+    __slots__ = ("urls", "removed", "names", "index", "prefixes", "typos")
+
+    def __init__(
+        self,
+        urls: Dict[str, str],
+        removed: AbstractSet[str],
+        names: Sequence[str],
+    ) -> None:
+        self.urls = urls
+        self.removed = removed
+        self.names = names
+        self.index = FuzzyIndex(names)
+        self.prefixes = PrefixIndex(names)
+        self.typos = TypoIndex(names)
+
+    def __len__(self) -> int:
+        return len(self.urls) + len(self.removed)
+
+    def apply(self, diff: InventoryDiff) -> "InventoryDelta":
+        """Returns a new delta holding both this one and the given diff.
+
+        Parameters
+        ----------
+        diff: :class:`InventoryDiff`
+            The changes to add.
+
+        Returns
+        -------
+        :class:`InventoryDelta`
+            The combined delta.
+        """
+        urls = dict(self.urls)
+        removed = set(self.removed)
+        names = set(self.names)
+
+        for name in diff.removed:
+            urls.pop(name, None)
+
+            if name in names:
+                names.discard(name)
+            else:
+                removed.add(name)
+
+        urls.update(diff.changed)
+        urls.update(diff.added)
+
+        for name in diff.added:
+            # An indexed name that comes back only needs its URL.
+            if name in removed:
+                removed.discard(name)
+            else:
+                names.add(name)
+
+        return InventoryDelta(urls, removed, sorted(names))
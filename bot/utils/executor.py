@@ -0,0 +1,99 @@
+"""
+Copyright (C) 2023  kyomi
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from asyncio import AbstractEventLoop, run_coroutine_threadsafe
+from concurrent.futures import (
+    Executor,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from multiprocessing import get_context
+from typing import AsyncIterator, Generator, Optional, TypeVar
+
+T = TypeVar("T")
+
+EXECUTOR_TYPES = ("thread", "process")
+
+
+def create_executor(kind: str, workers: Optional[int] = None) -> Executor:
+    """Creates the executor used to run CPU-bound work, like parsing
+    and indexing documentation inventories, away from the event loop.
+
+    A process pool avoids contending for the GIL with the event loop,
+    at the cost of pickling arguments and results between processes.
+
+    Parameters
+    ----------
+    kind: :class:`str`
+        Either ``"thread"`` or ``"process"``.
+    workers: Optional[:class:`int`]
+        The maximum number of workers. Defaults to ``None``, which
+        lets the executor pick a number based on the CPU count.
+
+    Returns
+    -------
+    :class:`concurrent.futures.Executor`
+        The created executor.
+
+    Raises
+    ------
+    ValueError
+        The executor type is not supported.
+    """
+    if kind == "thread":
+        return ThreadPoolExecutor(workers, thread_name_prefix="eris-worker")
+
+    if kind == "process":
+        # Forking a process that is running an event loop and a bunch of
+        # threads is asking for trouble, so workers are spawned instead.
+        return ProcessPoolExecutor(workers, mp_context=get_context("spawn"))
+
+    raise ValueError(f"Unknown executor type: {kind!r}.")
+
+
+async def _anext(iterator: AsyncIterator[T]) -> T:
+    return await anext(iterator)
+
+
+def iter_threadsafe(
+    iterator: AsyncIterator[T], loop: AbstractEventLoop
+) -> Generator[T, None, None]:
+    """Iterates over an asynchronous iterator from a worker thread, by
+    running every step of it in the given event loop. This lets code in
+    a :class:`ThreadPoolExecutor` consume a stream, like an HTTP
+    response, as it arrives.
+
+    Parameters
+    ----------
+    iterator: :class:`AsyncIterator[T]`
+        The asynchronous iterator to consume.
+    loop: :class:`asyncio.AbstractEventLoop`
+        The event loop the iterator belongs to. It must not be the loop
+        of the calling thread, or this will deadlock.
+
+    Yields
+    ------
+    T
+        The items of the iterator.
+    """
+    while True:
+        future = run_coroutine_threadsafe(_anext(iterator), loop)
+
+        try:
+            yield future.result()
+        except StopAsyncIteration:
+            return
@@ -0,0 +1,218 @@
+"""
+Copyright (C) 2023  kyomi
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from asyncio import sleep, to_thread
+from contextlib import asynccontextmanager
+from os import stat
+from os.path import join
+from random import uniform
+from typing import AsyncGenerator, AsyncIterator, Dict, Optional
+
+from aiohttp import ClientError, ClientResponse, ClientSession, ClientTimeout
+
+# Statuses worth retrying, as they usually go away on their own.
+RETRYABLE_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+
+DEFAULT_TIMEOUT = ClientTimeout(total=60, connect=10, sock_read=30)
+
+
+class FetchResponse:
+    """A successful response from :meth:`InventoryFetcher.fetch`.
+
+    Attributes
+    ----------
+    etag: Optional[:class:`str`]
+        The entity tag of the response, if any.
+    last_modified: Optional[:class:`str`]
+        The last modification date of the response, if any.
+    """
+
+    __slots__ = ("etag", "last_modified", "_chunks")
+
+    def __init__(
+        self,
+        chunks: AsyncIterator[bytes],
+        *,
+        etag: Optional[str],
+        last_modified: Optional[str],
+    ) -> None:
+        self.etag = etag
+        self.last_modified = last_modified
+        self._chunks = chunks
+
+    def iter_chunks(self) -> AsyncIterator[bytes]:
+        """Iterates over the body of the response, as it arrives."""
+        return self._chunks
+
+    async def read(self) -> bytes:
+        """Reads the whole body of the response."""
+        return b"".join([chunk async for chunk in self._chunks])
+
+
+async def _read_file(path: str, size: int) -> AsyncGenerator[bytes, None]:
+    with open(path, "rb") as file:
+        while chunk := await to_thread(file.read, size):
+            yield chunk
+
+
+class InventoryFetcher:
+    """Fetches documentation inventories over HTTP, with conditional
+    requests, timeouts and retries, or from a local mirror directory.
+
+    Parameters
+    ----------
+    session: :class:`aiohttp.ClientSession`
+        The session used to make requests.
+    mirror: Optional[:class:`str`]
+        A directory to read inventories from instead of the network,
+        e.g. to run offline or against recorded fixtures. Defaults to
+        ``None``.
+    retries: :class:`int`
+        How many times a failed request is retried. Defaults to ``3``.
+    timeout: :class:`aiohttp.ClientTimeout`
+        The timeout of each request.
+    """
+
+    __slots__ = ("session", "mirror", "retries", "timeout")
+
+    CHUNK_SIZE = 16 * 1024
+
+    # Retries wait a random delay of up to the base delay, doubling on
+    # each attempt, and capped at the maximum delay (in seconds).
+    RETRY_BASE_DELAY = 1.0
+    RETRY_MAX_DELAY = 30.0
+
+    def __init__(
+        self,
+        session: ClientSession,
+        *,
+        mirror: Optional[str] = None,
+        retries: int = 3,
+        timeout: ClientTimeout = DEFAULT_TIMEOUT,
+    ) -> None:
+        self.session = session
+        self.mirror = mirror
+        self.retries = retries
+        self.timeout = timeout
+
+    @asynccontextmanager
+    async def fetch(
+        self,
+        url: str,
+        *,
+        path: str,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> AsyncGenerator[Optional[FetchResponse], None]:
+        """Fetches an inventory. This is an asynchronous context manager
+        that keeps the response open while its body is being read.
+
+        Parameters
+        ----------
+        url: :class:`str`
+            The URL of the inventory.
+        path: :class:`str`
+            The path of the inventory inside the mirror directory.
+        etag: Optional[:class:`str`]
+            The entity tag of the copy of the inventory we have, if any.
+        last_modified: Optional[:class:`str`]
+            The last modification date of the copy of the inventory we
+            have, if any.
+
+        Yields
+        ------
+        Optional[:class:`FetchResponse`]
+            The response, or ``None`` if our copy is still up to date.
+
+        Raises
+        ------
+        RuntimeError
+            The inventory could not be fetched, even after retrying.
+        """
+        if self.mirror is not None:
+            async with self._fetch_mirror(path, etag) as resp:
+                yield resp
+            return
+
+        headers: Dict[str, str] = {}
+
+        if etag is not None:
+            headers["If-None-Match"] = etag
+        if last_modified is not None:
+            headers["If-Modified-Since"] = last_modified
+
+        resp = await self._request(url, headers)
+
+        try:
+            if resp.status == 304:
+                yield None
+            else:
+                yield FetchResponse(
+                    resp.content.iter_chunked(self.CHUNK_SIZE),
+                    etag=resp.headers.get("ETag"),
+                    last_modified=resp.headers.get("Last-Modified"),
+                )
+        finally:
+            resp.release()
+
+    async def _request(
+        self, url: str, headers: Dict[str, str]
+    ) -> ClientResponse:
+        error: Optional[Exception] = None
+
+        for attempt in range(self.retries + 1):
+            if attempt > 0:
+                delay = self.RETRY_BASE_DELAY * 2 ** (attempt - 1)
+                await sleep(uniform(0, min(delay, self.RETRY_MAX_DELAY)))
+
+            try:
+                resp = await self.session.get(
+                    url, headers=headers, timeout=self.timeout
+                )
+            except (ClientError, TimeoutError) as exc:
+                error = exc
+                continue
+
+            if resp.status in (200, 304):
+                return resp
+
+            resp.release()
+            error = RuntimeError(f"{url} responded with {resp.status}.")
+
+            if resp.status not in RETRYABLE_STATUSES:
+                break
+
+        raise RuntimeError(f"Cannot fetch {url}, try again later.") from error
+
+    @asynccontextmanager
+    async def _fetch_mirror(
+        self, path: str, etag: Optional[str]
+    ) -> AsyncGenerator[Optional[FetchResponse], None]:
+        assert self.mirror is not None
+        path = join(self.mirror, path)
+
+        try:
+            # The modification time of the file works as its entity tag.
+            tag = str(stat(path).st_mtime_ns)
+        except OSError as exc:
+            raise RuntimeError(f"Cannot read {path} from mirror.") from exc
+
+        if tag == etag:
+            yield None
+        else:
+            chunks = _read_file(path, self.CHUNK_SIZE)
+            yield FetchResponse(chunks, etag=tag, last_modified=None)
@@ -0,0 +1,563 @@
+"""
+Copyright (C) 2023  kyomi
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import re
+from heapq import merge
+from json import loads
+from os.path import join
+from typing import (
+    Any,
+    Dict,
+    Generator,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+    cast,
+)
+from zlib import decompressobj
+
+from bot.utils.diff import InventoryDelta, InventoryDiff
+from bot.utils.fuzzy import FuzzyIndex
+from bot.utils.prefix import PrefixIndex
+from bot.utils.table import LookupTable
+from bot.utils.typo import TypoIndex
+
+# Changes are applied as a delta until it holds more than this share of
+# the entries, or this many entries for small inventories, at which
+# point searching it stops being cheap and the indexes are rebuilt.
+MAX_DELTA_RATIO = 0.05
+MIN_DELTA_SIZE = 256
+
+
+def _prefix_key(name: str) -> Tuple[str, str]:
+    # The order of the names returned by PrefixIndex.search.
+    return name.lower(), name
+
+
+class Inventory:
+    """A documentation inventory, ready to be searched.
+
+    Parameters
+    ----------
+    table: :class:`LookupTable`
+        The lookup table, mapping entity names to documentation URLs.
+    index: :class:`FuzzyIndex[str]`
+        The fuzzy search index built over the names of ``table``, in
+        the same order.
+    timestamp: :class:`float`
+        The UNIX timestamp of when the inventory was last fetched.
+    etag: Optional[:class:`str`]
+        The entity tag of the fetched file, if any. Defaults to
+        ``None``.
+    last_modified: Optional[:class:`str`]
+        The last modification date of the fetched file, if any.
+        Defaults to ``None``.
+    prefixes: Optional[:class:`PrefixIndex`]
+        The prefix index over the names of ``table``, used for
+        autocompletion. Defaults to ``None``, which builds it.
+    typos: Optional[:class:`TypoIndex`]
+        The typo-tolerant index over the names of ``table``, used when
+        a query has no match at all. Defaults to ``None``, which builds
+        it.
+    delta: Optional[:class:`InventoryDelta`]
+        The entries that changed since ``table`` was built, see
+        :meth:`apply`. Defaults to ``None``.
+
+    The lookup methods of the inventory go through both ``table`` and
+    ``delta``, so they should be used instead of the indexes.
+    """
+
+    __slots__ = (
+        "table",
+        "index",
+        "prefixes",
+        "typos",
+        "delta",
+        "timestamp",
+        "etag",
+        "last_modified",
+    )
+
+    def __init__(
+        self,
+        table: LookupTable,
+        index: FuzzyIndex[str],
+        timestamp: float,
+        *,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+        prefixes: Optional[PrefixIndex] = None,
+        typos: Optional[TypoIndex] = None,
+        delta: Optional[InventoryDelta] = None,
+    ) -> None:
+        self.table = table
+        self.index = index
+        self.prefixes = (
+            PrefixIndex(table.names) if prefixes is None else prefixes
+        )
+        self.typos = TypoIndex(table.names) if typos is None else typos
+        self.delta = delta
+        self.timestamp = timestamp
+        self.etag = etag
+        self.last_modified = last_modified
+
+    def __len__(self) -> int:
+        delta = self.delta
+
+        if delta is None:
+            return len(self.table)
+
+        return len(self.table) - len(delta.removed) + len(delta.names)
+
+    def __getitem__(self, name: str) -> str:
+        delta = self.delta
+
+        if delta is not None:
+            url = delta.urls.get(name)
+
+            if url is not None:
+                return url
+
+            if name in delta.removed:
+                raise KeyError(name)
+
+        return self.table[name]
+
+    def entries(self) -> Iterator[Tuple[str, str]]:
+        """Iterates over the name and URL of every entry, sorted by
+        name.
+        """
+        table, delta = self.table, self.delta
+        current = zip(table.names, map(table.url, range(len(table))))
+
+        if delta is None:
+            return current
+
+        kept = (
+            (name, delta.urls.get(name, url))
+            for name, url in current
+            if name not in delta.removed
+        )
+        added = ((name, delta.urls[name]) for name in delta.names)
+
+        return merge(kept, added)
+
+    def search(
+        self, query: str, *, limit: int, timeout: Optional[float] = None
+    ) -> List[Tuple[int, int, str]]:
+        """Fuzzy searches the names of the entries, like
+        :meth:`FuzzyIndex.search` does with ``raw=True``.
+        """
+        hits = cast(
+            List[Tuple[int, int, str]],
+            self.index.search(
+                query,
+                raw=True,
+                limit=self.index_limit(limit),
+                timeout=timeout,
+                prefixes=self.prefixes,
+            ),
+        )
+        return self.merge_hits(query, hits, limit=limit)
+
+    def index_limit(self, limit: int) -> int:
+        """Returns how many results :attr:`index` has to be searched
+        for, so that ``limit`` of them are left once the removed names
+        are skipped.
+        """
+        return limit + (0 if self.delta is None else len(self.delta.removed))
+
+    def merge_hits(
+        self, query: str, hits: List[Tuple[int, int, str]], *, limit: int
+    ) -> List[Tuple[int, int, str]]:
+        """Merges the results of searching :attr:`index`, e.g. in
+        another process, with the changes of :attr:`delta`.
+
+        Parameters
+        ----------
+        query: :class:`str`
+            The query that was searched for.
+        hits: List[Tuple[:class:`int`, :class:`int`, :class:`str`]]
+            The results of :attr:`index`, searched for
+            :meth:`index_limit` results with ``raw=True``.
+        limit: :class:`int`
+            The maximum number of results to return.
+
+        Returns
+        -------
+        List[Tuple[:class:`int`, :class:`int`, :class:`str`]]
+            The results, as :meth:`search` returns them.
+        """
+        delta = self.delta
+
+        if delta is None:
+            return hits[:limit]
+
+        # Names are unique, so ties are broken by name like finder does.
+        hits = [hit for hit in hits if hit[2] not in delta.removed]
+        hits += cast(
+            List[Tuple[int, int, str]],
+            delta.index.search(
+                query, raw=True, limit=limit, prefixes=delta.prefixes
+            ),
+        )
+        hits.sort()
+
+        return hits[:limit]
+
+    def complete(self, prefix: str, *, limit: int) -> List[str]:
+        """Returns the names starting with the given prefix, like
+        :meth:`PrefixIndex.search` does.
+        """
+        delta = self.delta
+
+        if delta is None:
+            return self.prefixes.search(prefix, limit=limit)
+
+        extra = len(delta.removed)
+        names = self.prefixes.search(prefix, limit=limit + extra)
+        names = [name for name in names if name not in delta.removed]
+        added = delta.prefixes.search(prefix, limit=limit)
+
+        return list(merge(names, added, key=_prefix_key))[:limit]
+
+    def suggest(
+        self, query: str, *, limit: int, timeout: Optional[float] = None
+    ) -> List[str]:
+        """Returns the names within a few typos of the query, like
+        :meth:`TypoIndex.search` does.
+        """
+        delta = self.delta
+
+        if delta is None:
+            return self.typos.search(query, limit=limit, timeout=timeout)
+
+        extra = len(delta.removed)
+        ranked = self.typos.rank(query, limit=limit + extra, timeout=timeout)
+        ranked = [hit for hit in ranked if hit[2] not in delta.removed]
+        ranked += delta.typos.rank(query, limit=limit, timeout=timeout)
+        ranked.sort()
+
+        return [name for _, _, name in ranked[:limit]]
+
+    def apply(self, diff: InventoryDiff, timestamp: float) -> "Inventory":
+        """Returns a new inventory with the given changes, sharing the
+        table and indexes of this one.
+
+        Parameters
+        ----------
+        diff: :class:`InventoryDiff`
+            The changes to apply, against the entries of this inventory.
+        timestamp: :class:`float`
+            The UNIX timestamp of when the changes were fetched.
+
+        Returns
+        -------
+        :class:`Inventory`
+            The updated inventory.
+        """
+        delta = self.delta or InventoryDelta({}, set(), [])
+
+        return Inventory(
+            self.table,
+            self.index,
+            timestamp,
+            prefixes=self.prefixes,
+            typos=self.typos,
+            delta=delta.apply(diff),
+        )
+
+
+class SphinxObjectFileReader:
+    """Reads a Sphinx ``objects.inv`` file from a stream of chunks, as
+    they arrive, so the whole file never has to be held in memory.
+
+    Parameters
+    ----------
+    chunks: :class:`Iterable[bytes]`
+        The chunks of the file, in order. A whole file can be given as
+        a single chunk.
+    """
+
+    __slots__ = ("chunks", "buffer", "offset")
+
+    BUFSIZE = 16 * 1024
+
+    def __init__(self, chunks: Iterable[bytes]) -> None:
+        self.chunks = iter(chunks)
+        self.buffer = b""
+        self.offset = 0
+
+    def readline(self) -> str:
+        pos = self.buffer.find(b"\n", self.offset)
+
+        while pos == -1:
+            chunk = next(self.chunks, b"")
+
+            if not chunk:
+                pos = len(self.buffer)
+                break
+
+            # Only the header is read line by line, so this only ever
+            # copies a few short lines.
+            self.buffer = self.buffer[self.offset :] + chunk
+            self.offset = 0
+            pos = self.buffer.find(b"\n")
+
+        line = self.buffer[self.offset : pos + 1]
+        self.offset = pos + 1
+
+        return line.decode("utf-8")
+
+    def skipline(self) -> None:
+        self.readline()
+
+    def read_compressed_chunks(self) -> Generator[bytes, None, None]:
+        decompressor = decompressobj()
+        chunk = self.buffer[self.offset :]
+
+        self.buffer = b""
+        self.offset = 0
+
+        while True:
+            # Decompressed data is yielded in bounded pieces, so a
+            # single chunk never expands into a huge buffer.
+            while chunk:
+                yield decompressor.decompress(chunk, self.BUFSIZE)
+                chunk = decompressor.unconsumed_tail
+
+            chunk = next(self.chunks, b"")
+
+            if not chunk:
+                break
+
+        yield decompressor.flush()
+
+    def read_compressed_lines(self) -> Generator[str, None, None]:
+        pending = b""
+
+        for chunk in self.read_compressed_chunks():
+            if pending:
+                # Only the incomplete last line of the previous chunk is
+                # carried over, instead of everything after each line.
+                chunk = pending + chunk
+
+            start = 0
+            pos = chunk.find(b"\n")
+
+            while pos != -1:
+                yield chunk[start:pos].decode("utf-8")
+                start = pos + 1
+                pos = chunk.find(b"\n", start)
+
+            pending = chunk[start:]
+
+        if pending:
+            yield pending.decode("utf-8")
+
+
+def parse_object_inv(
+    stream: SphinxObjectFileReader, url: str
+) -> Dict[str, str]:
+    result: Dict[str, str] = {}
+
+    inv_version = stream.readline().rstrip()
+
+    if inv_version != "# Sphinx inventory version 2":
+        raise RuntimeError("Invalid objects.inv file version.")
+
+    projname = stream.readline().rstrip()[11:]
+    stream.readline().rstrip()[11:]
+
+    line = stream.readline()
+    if "zlib" not in line:
+        raise RuntimeError("Invalid objects.inv file, not z-lib compatible.")
+
+    entry_regex = re.compile(r"(?x)(.+?)\s+(\S*:\S*)\s+(-?\d+)\s+(\S+)\s+(.*)")
+
+    for line in stream.read_compressed_lines():
+        match = entry_regex.match(line.rstrip())
+
+        if not match:
+            continue
+
+        name, directive, _, location, dispname = match.groups()
+        domain, _, subdirective = directive.partition(":")
+
+        if directive == "py:module" and name in result:
+            # From the Sphinx repository: due to a bug in 1.1 and
+            # below, two inventory entries are created for Python
+            # modules, and the first one is correct.
+            continue
+
+        if directive == "std:doc":
+            subdirective = "label"
+
+        if location.endswith("$"):
+            location = location[:-1] + name
+
+        key = name if dispname == "-" else dispname
+        prefix = f"{subdirective}:" if domain == "std" else ""
+
+        if projname == "discord.py":
+            key = key.replace("discord.ext.commands.", "")
+            key = key.replace("discord.", "")
+
+        result[f"{prefix}{key}"] = join(url, location)
+
+    return result
+
+
+def parse_objects_json(data: Dict[str, Any], base_url: str) -> Dict[str, str]:
+    result: Dict[str, str] = {}
+
+    for cls in data["classes"]:
+        result[cls["name"]] = f"{base_url}/{cls['name']}"
+
+        try:
+            for method in cls["methods"]:
+                if method["name"].startswith("_"):
+                    continue
+
+                name = f"{cls['name']}.{method['name']}"
+                url = f"{base_url}/{cls['name']}#{method['name']}"
+                result[name] = url
+
+            for prop in cls["props"]:
+                if prop["name"].startswith("_"):
+                    continue
+
+                name = f"{cls['name']}.{prop['name']}"
+                url = f"{base_url}/{cls['name']}#{prop['name']}"
+                result[name] = url
+        except KeyError:
+            pass
+
+    for func in data["functions"]:
+        result[func["name"]] = f"{base_url}/{func['name']}"
+
+    return result
+
+
+def read_sphinx_entries(chunks: Iterable[bytes], url: str) -> Dict[str, str]:
+    """Parses a Sphinx ``objects.inv`` file, without indexing it.
+
+    This is meant to run in a worker of :attr:`Eris.executor`, see
+    :func:`build_sphinx_inventory`.
+    """
+    return parse_object_inv(SphinxObjectFileReader(chunks), url)
+
+
+def read_json_entries(buffer: bytes, url: str) -> Dict[str, str]:
+    """Parses a discord.js documentation manifest, without indexing it.
+
+    This is meant to run in a worker of :attr:`Eris.executor`, see
+    :func:`build_json_inventory`.
+    """
+    return parse_objects_json(loads(buffer), url)
+
+
+def build_inventory(entries: Mapping[str, str], timestamp: float) -> Inventory:
+    """Indexes the given entries, mapping names to URLs."""
+    table = LookupTable(entries)
+    return Inventory(table, FuzzyIndex(table.names), timestamp)
+
+
+def update_inventory(
+    inventory: Inventory, entries: Mapping[str, str], timestamp: float
+) -> Tuple[Inventory, InventoryDiff]:
+    """Updates an inventory with the entries of a new version of it.
+
+    Only the changes are indexed, unless they add up to too much of the
+    inventory, in which case it's built again from scratch.
+
+    Parameters
+    ----------
+    inventory: :class:`Inventory`
+        The current inventory.
+    entries: Mapping[:class:`str`, :class:`str`]
+        The new entries, mapping names to URLs.
+    timestamp: :class:`float`
+        The UNIX timestamp of when the entries were fetched.
+
+    Returns
+    -------
+    Tuple[:class:`Inventory`, :class:`InventoryDiff`]
+        The updated inventory, and what changed.
+    """
+    diff = InventoryDiff.compute(inventory.entries(), entries)
+    size = len(diff) + len(inventory.delta or ())
+    limit = max(MIN_DELTA_SIZE, len(entries) * MAX_DELTA_RATIO)
+
+    if size > limit:
+        return build_inventory(entries, timestamp), diff
+
+    return inventory.apply(diff, timestamp), diff
+
+
+def build_sphinx_inventory(
+    chunks: Iterable[bytes], url: str, timestamp: float
+) -> Inventory:
+    """Parses a Sphinx ``objects.inv`` file and indexes it.
+
+    This is meant to run in a worker of :attr:`Eris.executor`, so it
+    must stay a picklable, module-level function.
+
+    Parameters
+    ----------
+    chunks: :class:`Iterable[bytes]`
+        The contents of the ``objects.inv`` file, in chunks. This can
+        be a stream that is still being downloaded.
+    url: :class:`str`
+        The base URL of the documentation.
+    timestamp: :class:`float`
+        The UNIX timestamp of when the file was fetched.
+
+    Returns
+    -------
+    :class:`Inventory`
+        The parsed and indexed inventory.
+    """
+    return build_inventory(read_sphinx_entries(chunks, url), timestamp)
+
+
+def build_json_inventory(
+    buffer: bytes, url: str, timestamp: float
+) -> Inventory:
+    """Parses a discord.js documentation manifest and indexes it.
+
+    This is meant to run in a worker of :attr:`Eris.executor`, so it
+    must stay a picklable, module-level function.
+
+    Parameters
+    ----------
+    buffer: :class:`bytes`
+        The contents of the JSON manifest.
+    url: :class:`str`
+        The base URL of the documentation.
+    timestamp: :class:`float`
+        The UNIX timestamp of when the manifest was fetched.
+
+    Returns
+    -------
+    :class:`Inventory`
+        The parsed and indexed inventory.
+    """
+    return build_inventory(read_json_entries(buffer, url), timestamp)
@@ -0,0 +1,214 @@
+"""
+Copyright (C) 2023  kyomi
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from contextlib import contextmanager
+from copy import copy
+from json import dumps
+from logging import INFO, WARN, Filter, Formatter, LogRecord, getLogger
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from queue import SimpleQueue
+from threading import Lock
+from time import monotonic
+from typing import Any, Dict, Generator, Optional, Tuple
+
+from rich.logging import RichHandler
+from rich.text import Text
+
+
+class StreamHandler(RichHandler):
+    """A custom logging handler with prettier output."""
+
+    def __init__(self) -> None:
+        super().__init__(
+            omit_repeated_times=False,
+            rich_tracebacks=True,
+            tracebacks_show_locals=True,
+        )
+
+    def get_level_text(self, record: LogRecord) -> Text:
+        levelname = record.levelname
+        style = f"logging.level.{levelname.lower()}"
+        return Text.styled(f"[{levelname}]", style=style)
+
+
+class LocalQueueHandler(QueueHandler):
+    """A queue handler that keeps the exception info of records, so
+    the rich tracebacks (with locals) are still rendered by the
+    listener thread, instead of being flattened into text right away.
+    """
+
+    def prepare(self, record: LogRecord) -> LogRecord:
+        # Only the message is formatted here, as the handlers of the
+        # listener format everything else.
+        record = copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+
+        return record
+
+
+class JSONFormatter(Formatter):
+    """Formats records as JSON objects, one per line."""
+
+    def format(self, record: LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S%z"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+
+        return dumps(entry, ensure_ascii=False)
+
+
+class RateLimitFilter(Filter):
+    """Lets through at most a number of records per period from each of
+    the given loggers, and their children. Warnings and errors are never
+    dropped, and the number of dropped records is added to the next one
+    that goes through.
+
+    Parameters
+    ----------
+    limits: Dict[:class:`str`, Tuple[:class:`int`, :class:`float`]]
+        The number of records allowed per period (in seconds), keyed by
+        logger name.
+    """
+
+    def __init__(self, limits: Dict[str, Tuple[int, float]]) -> None:
+        super().__init__()
+        self.limits = limits
+        # Per logger, the start of the current period, the number of
+        # records let through and the number dropped in it.
+        self.windows: Dict[str, Tuple[float, int, int]] = {}
+        self.lock = Lock()
+
+    def get_limit(self, name: str) -> Optional[str]:
+        while name:
+            if name in self.limits:
+                return name
+
+            name = name.rpartition(".")[0]
+
+        return None
+
+    def filter(self, record: LogRecord) -> bool:
+        if record.levelno >= WARN:
+            return True
+
+        name = self.get_limit(record.name)
+
+        if name is None:
+            return True
+
+        count, period = self.limits[name]
+        now = monotonic()
+
+        with self.lock:
+            started, passed, dropped = self.windows.get(name, (now, 0, 0))
+
+            if now - started >= period:
+                started, passed = now, 0
+
+            if passed >= count:
+                self.windows[name] = (started, passed, dropped + 1)
+                return False
+
+            self.windows[name] = (started, passed + 1, 0)
+
+        if dropped:
+            record.msg = f"{record.msg} ({dropped} similar records dropped)"
+
+        return True
+
+
+# Loggers that can get noisy, with how many records they may log per
+# period (in seconds).
+LOG_RATE_LIMITS = {
+    "discord.gateway": (10, 60.0),
+    "discord.client": (10, 60.0),
+}
+
+
+@contextmanager
+def setup_logging(
+    log_format: str = "text", name: str = "eris"
+) -> Generator[None, None, None]:
+    log = getLogger()
+    listener: Optional[QueueListener] = None
+
+    try:
+        # __enter__
+        max_bytes = 32 * 1024 * 1024  # 32 MiB
+
+        getLogger("discord").setLevel(INFO)
+        getLogger("discord.http").setLevel(WARN)
+
+        log.setLevel(INFO)
+
+        datetime_format = "%Y-%m-%d %H:%M:%S"
+        text_format = "[{asctime}] [{levelname}] {name}: {message}"
+
+        if log_format == "json":
+            filename = f"logs/{name}.jsonl"
+            formatter = JSONFormatter()
+        else:
+            filename = f"logs/{name}.log"
+            formatter = Formatter(
+                fmt=text_format, datefmt=datetime_format, style="{"
+            )
+
+        handler = RotatingFileHandler(
+            filename=filename,
+            encoding="utf-8",
+            mode="w",
+            maxBytes=max_bytes,
+            backupCount=5,
+        )
+        handler.setFormatter(formatter)
+
+        # Formatting and writing records, especially rich tracebacks,
+        # can take a while, so it's done by a background thread instead
+        # of the thread logging them, which is usually the event loop.
+        queue: SimpleQueue[LogRecord] = SimpleQueue()
+        queue_handler = LocalQueueHandler(queue)
+        queue_handler.addFilter(RateLimitFilter(LOG_RATE_LIMITS))
+
+        listener = QueueListener(
+            queue, handler, StreamHandler(), respect_handler_level=True
+        )
+        listener.start()
+
+        log.addHandler(queue_handler)
+
+        yield
+    finally:
+        # __exit__
+        if listener is not None:
+            # Waits for every queued record to be handled.
+            listener.stop()
+
+            for handler in listener.handlers:
+                handler.close()
+
+        handlers = log.handlers[:]
+
+        for handler in handlers:
+            handler.close()
+            log.removeHandler(handler)
@@ -0,0 +1,497 @@
+"""
+Copyright (C) 2023  kyomi
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from logging import getLogger
+from time import perf_counter
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generator,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+from aiohttp import web
+
+log = getLogger(__name__)
+
+M = TypeVar("M", bound="Metric")
+
+# The count of each bucket (not cumulative, with one more for values
+# past the last bucket) and the sum of the observed values.
+_Buckets = Tuple[List[int], List[float]]
+
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ""
+
+    pairs = ",".join(
+        f'{name}="{_escape(value)}"' for name, value in zip(names, values)
+    )
+    return f"{{{pairs}}}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric(ABC):
+    """Base class of the metrics of a :class:`MetricsRegistry`.
+
+    Parameters
+    ----------
+    name: :class:`str`
+        The name of the metric.
+    documentation: :class:`str`
+        A short description of the metric.
+    labels: Tuple[:class:`str`, ...]
+        The names of the labels of the metric.
+    """
+
+    __slots__ = ("name", "documentation", "labels")
+
+    TYPE = "untyped"
+
+    def __init__(
+        self, name: str, documentation: str, labels: Tuple[str, ...] = ()
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+
+    def _check(self, values: Tuple[str, ...]) -> None:
+        if len(values) != len(self.labels):
+            raise ValueError(
+                f'Metric "{self.name}" expects labels {self.labels}.'
+            )
+
+    @abstractmethod
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        """Yields the samples of the metric, as tuples of the form
+        (suffix, labels, value).
+        """
+
+    def render(self) -> Iterator[str]:
+        """Yields the lines of the metric, in the Prometheus text
+        exposition format.
+        """
+        yield f"# HELP {self.name} {_escape(self.documentation)}"
+        yield f"# TYPE {self.name} {self.TYPE}"
+
+        for suffix, labels, value in self.samples():
+            yield f"{self.name}{suffix}{labels} {_format_value(value)}"
+
+
+class Counter(Metric):
+    """A value that only ever goes up."""
+
+    __slots__ = ("_values",)
+
+    TYPE = "counter"
+
+    def __init__(
+        self, name: str, documentation: str, labels: Tuple[str, ...] = ()
+    ) -> None:
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        """Increments the counter with the given label values."""
+        self._check(labels)
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        for values, value in self._values.items():
+            yield "", _format_labels(self.labels, values), value
+
+
+class Gauge(Metric):
+    """A value that can go up and down."""
+
+    __slots__ = ("_values",)
+
+    TYPE = "gauge"
+
+    def __init__(
+        self, name: str, documentation: str, labels: Tuple[str, ...] = ()
+    ) -> None:
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, *labels: str) -> None:
+        """Sets the gauge with the given label values."""
+        self._check(labels)
+        self._values[labels] = value
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        for values, value in self._values.items():
+            yield "", _format_labels(self.labels, values), value
+
+
+class Callback(Metric):
+    """A value read from a function every time the metrics are
+    collected, for values that are already tracked somewhere else.
+
+    Parameters
+    ----------
+    kind: :class:`str`
+        The Prometheus type of the metric, e.g. ``"gauge"``.
+    func: Callable[[], :class:`float`]
+        The function returning the value of the metric.
+    """
+
+    __slots__ = ("kind", "func")
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        kind: str,
+        func: Callable[[], float],
+    ) -> None:
+        super().__init__(name, documentation)
+        self.kind = kind
+        self.func = func
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {_escape(self.documentation)}"
+        yield f"# TYPE {self.name} {self.kind}"
+        yield f"{self.name} {_format_value(self.func())}"
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        yield "", "", self.func()
+
+
+class Histogram(Metric):
+    """Counts observed values in buckets, e.g. to track latencies.
+
+    Parameters
+    ----------
+    buckets: Tuple[:class:`float`, ...]
+        The upper bounds of the buckets, in increasing order.
+    """
+
+    __slots__ = ("buckets", "_values")
+
+    TYPE = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labels)
+        self.buckets = buckets
+        self._values: Dict[Tuple[str, ...], _Buckets] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        """Records a value with the given label values."""
+        self._check(labels)
+        entry = self._values.get(labels)
+
+        if entry is None:
+            entry = self._values[labels] = ([0] * (len(self.buckets) + 1), [0])
+
+        counts, total = entry
+        counts[bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    @contextmanager
+    def time(self, *labels: str) -> Generator[None, None, None]:
+        """Records how long, in seconds, the body of a ``with`` block
+        takes, with the given label values.
+        """
+        started = perf_counter()
+
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - started, *labels)
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        names = self.labels + ("le",)
+
+        for values, (counts, total) in self._values.items():
+            cumulative = 0
+            bounds = self.buckets + (float("inf"),)
+
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                labels = values + (_format_value(bound),)
+                yield "_bucket", _format_labels(names, labels), cumulative
+
+            labels = _format_labels(self.labels, values)
+            yield "_sum", labels, total[0]
+            yield "_count", labels, cumulative
+
+
+class MetricsRegistry:
+    """Holds the metrics of the bot, and renders them in the Prometheus
+    text exposition format.
+
+    Metrics are registered once and looked up by name afterwards, so
+    extensions can ask for their metrics again when they are reloaded.
+    """
+
+    __slots__ = ("_metrics",)
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+
+    def _register(self, metric: M) -> M:
+        current = self._metrics.get(metric.name)
+
+        if current is None:
+            self._metrics[metric.name] = metric
+            return metric
+
+        if type(current) is not type(metric):
+            raise ValueError(
+                f'Metric "{metric.name}" is already registered as a '
+                f"{current.TYPE}."
+            )
+
+        return current  # type: ignore
+
+    def counter(
+        self, name: str, documentation: str, labels: Tuple[str, ...] = ()
+    ) -> Counter:
+        """Returns the counter with the given name, registering it if
+        needed.
+        """
+        return self._register(Counter(name, documentation, labels))
+
+    def gauge(
+        self, name: str, documentation: str, labels: Tuple[str, ...] = ()
+    ) -> Gauge:
+        """Returns the gauge with the given name, registering it if
+        needed.
+        """
+        return self._register(Gauge(name, documentation, labels))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labels: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        """Returns the histogram with the given name, registering it if
+        needed.
+        """
+        return self._register(Histogram(name, documentation, labels, buckets))
+
+    def callback(
+        self,
+        name: str,
+        documentation: str,
+        func: Callable[[], float],
+        *,
+        kind: str = "gauge",
+    ) -> Callback:
+        """Registers a metric read from a function, replacing any
+        previous one with the same name.
+        """
+        metric = Callback(name, documentation, kind, func)
+        self._metrics[name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Renders every metric in the Prometheus text exposition
+        format.
+        """
+        lines: List[str] = []
+
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+
+        return "\n".join(lines) + "\n"
+
+
+def _add_label(line: str, pair: str) -> str:
+    # The name of a sample ends at its labels, if it has any, or at the
+    # space before its value.
+    space = line.find(" ")
+    brace = line.find("{", 0, space)
+
+    if brace == -1:
+        return f"{line[:space]}{{{pair}}}{line[space:]}"
+
+    if line[brace + 1] == "}":
+        return f"{line[: brace + 1]}{pair}{line[brace + 1 :]}"
+
+    return f"{line[: brace + 1]}{pair},{line[brace + 1 :]}"
+
+
+def merge_metrics(label: str, sources: Mapping[str, str]) -> str:
+    """Merges metrics rendered by several processes into one exposition,
+    adding a label to every sample with the process it came from.
+
+    Parameters
+    ----------
+    label: :class:`str`
+        The name of the label to add.
+    sources: Mapping[:class:`str`, :class:`str`]
+        The metrics of each process, in the Prometheus text exposition
+        format, keyed by the value of the label.
+
+    Returns
+    -------
+    :class:`str`
+        The merged metrics, in the same format.
+    """
+    # Every sample of a metric must follow its HELP and TYPE lines, so
+    # samples are grouped by metric, in the order they were first seen.
+    headers: Dict[str, List[str]] = {}
+    samples: Dict[str, List[str]] = {}
+    # The process whose HELP and TYPE lines are kept for each metric.
+    owners: Dict[str, str] = {}
+
+    for value, text in sources.items():
+        pair = f'{label}="{_escape(value)}"'
+        name = ""
+
+        for line in text.splitlines():
+            if line.startswith("# "):
+                name = line.split(" ", 3)[2]
+
+                if owners.setdefault(name, value) == value:
+                    headers.setdefault(name, []).append(line)
+                    samples.setdefault(name, [])
+            elif line:
+                samples.setdefault(name, []).append(_add_label(line, pair))
+
+    lines: List[str] = []
+
+    for name, group in samples.items():
+        lines.extend(headers.get(name, ()))
+        lines.extend(group)
+
+    return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Serves the metrics of a :class:`MetricsRegistry` over HTTP, on
+    the ``/metrics`` path, from the running event loop. A health check
+    is served as JSON on the ``/health`` path.
+
+    Parameters
+    ----------
+    registry: :class:`MetricsRegistry`
+        The metrics to serve.
+    host: :class:`str`
+        The address to listen on. Defaults to ``"127.0.0.1"``, so the
+        metrics are only reachable locally.
+    port: :class:`int`
+        The port to listen on. Defaults to ``9100``.
+    health: Optional[Callable[[], Dict[:class:`str`, Any]]]
+        A function returning the health check. Defaults to ``None``,
+        which serves an empty one.
+    """
+
+    __slots__ = ("registry", "host", "port", "health", "_runner")
+
+    def __init__(
+        self,
+        registry: MetricsRegistry,
+        host: str = "127.0.0.1",
+        port: int = 9100,
+        *,
+        health: Optional[Callable[[], Dict[str, Any]]] = None,
+    ) -> None:
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.health = health
+
+        self._runner: Optional[web.AppRunner] = None
+
+    async def collect(self) -> str:
+        """Renders the metrics to serve."""
+        return self.registry.render()
+
+    async def check_health(self) -> Dict[str, Any]:
+        """Returns the health check to serve."""
+        return self.health() if self.health is not None else {}
+
+    async def handle(self, request: web.Request) -> web.Response:
+        return web.Response(
+            text=await self.collect(),
+            content_type="text/plain",
+            headers={"Cache-Control": "no-store"},
+        )
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        return web.json_response(
+            await self.check_health(), headers={"Cache-Control": "no-store"}
+        )
+
+    async def start(self) -> None:
+        """Starts serving the metrics."""
+        if self._runner is not None:
+            return
+
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle)
+        app.router.add_get("/health", self.handle_health)
+
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, self.host, self.port).start()
+
+        self._runner = runner
+        log.info(f"Serving metrics on http://{self.host}:{self.port}.")
+
+    async def stop(self) -> None:
+        """Stops serving the metrics."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,91 @@
+"""
+Copyright (C) 2023  kyomi
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from asyncio import Task, create_task, get_running_loop, sleep
+from logging import getLogger
+from typing import Optional
+
+log = getLogger(__name__)
+
+
+class LoopMonitor:
+    """Measures how long the event loop is blocked, by checking how
+    late a periodic sleep wakes up.
+
+    Parameters
+    ----------
+    interval: :class:`float`
+        How often, in seconds, to check the event loop.
+    threshold: :class:`float`
+        How long, in seconds, the event loop must be blocked for a
+        warning to be logged.
+
+    Attributes
+    ----------
+    blocked: :class:`float`
+        The total time, in seconds, the event loop was blocked.
+    max_lag: :class:`float`
+        The longest time, in seconds, the event loop was blocked.
+    last_lag: :class:`float`
+        How long, in seconds, the event loop was blocked last time it
+        was checked.
+    """
+
+    __slots__ = (
+        "interval",
+        "threshold",
+        "blocked",
+        "max_lag",
+        "last_lag",
+        "_task",
+    )
+
+    def __init__(self, interval: float = 0.1, threshold: float = 0.1) -> None:
+        self.interval = interval
+        self.threshold = threshold
+
+        self.blocked = 0.0
+        self.max_lag = 0.0
+        self.last_lag = 0.0
+
+        self._task: Optional[Task[None]] = None
+
+    def start(self) -> None:
+        """Starts monitoring the running event loop."""
+        if self._task is None:
+            self._task = create_task(self._run())
+
+    def stop(self) -> None:
+        """Stops monitoring the event loop."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        loop = get_running_loop()
+
+        while True:
+            before = loop.time()
+            await sleep(self.interval)
+            lag = max(loop.time() - before - self.interval, 0.0)
+
+            self.last_lag = lag
+            self.blocked += lag
+            self.max_lag = max(self.max_lag, lag)
+
+            if lag >= self.threshold:
+                log.warning(f"Event loop was blocked for {lag:.3f}s.")
@@ -0,0 +1,134 @@
+"""
+Copyright (C) 2023  kyomi
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import List, Sequence, Tuple
+
+# Sorts after any character, so every key starting with a prefix sorts
+# before the prefix followed by it.
+_LAST_CHAR = "\U0010ffff"
+
+
+class PrefixIndex:
+    """A case-insensitive prefix index over a sequence of names, kept as
+    a sorted array searched with binary searches.
+
+    The ranges of the last few searched prefixes are remembered, so
+    typing one more character only searches the range of the previous
+    prefix instead of the whole array.
+
+    Parameters
+    ----------
+    names: Sequence[:class:`str`]
+        The names to index.
+    """
+
+    __slots__ = ("names", "keys", "order", "_ranges")
+
+    RANGES_SIZE = 256
+
+    def __init__(self, names: Sequence[str]) -> None:
+        folded = [name.lower() for name in names]
+        order = sorted(range(len(names)), key=folded.__getitem__)
+
+        self.names = names
+        self.keys: Sequence[str] = [folded[i] for i in order]
+        self.order: Sequence[int] = array("I", order)
+
+        self._ranges: OrderedDict[str, Tuple[int, int]] = OrderedDict()
+
+    @classmethod
+    def from_parts(
+        cls, names: Sequence[str], keys: Sequence[str], order: Sequence[int]
+    ) -> "PrefixIndex":
+        """Creates an index from the attributes of another one, e.g.
+        when loading it back from a snapshot. These can be views over a
+        memory-mapped file.
+        """
+        self = cls.__new__(cls)
+
+        self.names = names
+        self.keys = keys
+        self.order = order
+        self._ranges = OrderedDict()
+
+        return self
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _range(self, prefix: str) -> Tuple[int, int]:
+        lo, hi = 0, len(self.keys)
+
+        # Start from the range of the longest prefix of this one that
+        # was searched recently, if any.
+        for end in range(len(prefix), -1, -1):
+            known = self._ranges.get(prefix[:end])
+
+            if known is not None:
+                if end == len(prefix):
+                    self._ranges.move_to_end(prefix)
+                    return known
+
+                lo, hi = known
+                break
+
+        lo = bisect_left(self.keys, prefix, lo, hi)
+        hi = bisect_left(self.keys, prefix + _LAST_CHAR, lo, hi)
+
+        self._ranges[prefix] = (lo, hi)
+
+        if len(self._ranges) > self.RANGES_SIZE:
+            self._ranges.popitem(last=False)
+
+        return lo, hi
+
+    def positions(self, prefix: str) -> Sequence[int]:
+        """Returns the positions in :attr:`names` of every name starting
+        with the given prefix, ignoring case, in alphabetical order.
+
+        Unlike :meth:`search`, this leaves the remembered ranges alone,
+        so it can be called from several threads at once.
+        """
+        prefix = prefix.lower()
+        lo = bisect_left(self.keys, prefix)
+        hi = bisect_left(self.keys, prefix + _LAST_CHAR, lo)
+
+        return self.order[lo:hi]
+
+    def search(self, prefix: str, *, limit: int) -> List[str]:
+        """Returns the names starting with the given prefix, ignoring
+        case, in alphabetical order. Exact matches come first.
+
+        Parameters
+        ----------
+        prefix: :class:`str`
+            The prefix to search for.
+        limit: :class:`int`
+            The maximum number of names to return.
+
+        Returns
+        -------
+        List[:class:`str`]
+            The matching names.
+        """
+        lo, hi = self._range(prefix.lower())
+        hi = min(hi, lo + max(limit, 0))
+
+        return [self.names[i] for i in self.order[lo:hi]]
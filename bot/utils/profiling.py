@@ -0,0 +1,229 @@
+"""
+Copyright (C) 2023  kyomi
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import sys
+import tracemalloc
+from collections import Counter
+from cProfile import Profile
+from io import StringIO
+from os.path import basename
+from pstats import Stats
+from threading import Event, Thread
+from types import CodeType, FrameType
+from typing import List, Optional, Set
+
+# Allocations made by the profiling machinery itself are left out of
+# the reports.
+_IGNORED_FILES = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def _describe(code: CodeType) -> str:
+    return (
+        f"{code.co_name} ({basename(code.co_filename)}:{code.co_firstlineno})"
+    )
+
+
+class StackSampler:
+    """A sampling profiler, which records the stack of a thread at a
+    fixed interval from another thread.
+
+    Unlike :class:`cProfile.Profile`, this doesn't slow down the
+    profiled code, and it sees time spent in every task running on the
+    event loop, not only in the coroutine being awaited.
+
+    Parameters
+    ----------
+    thread_id: :class:`int`
+        The identifier of the thread to sample.
+    interval: :class:`float`
+        How often, in seconds, to take a sample.
+
+    Attributes
+    ----------
+    samples: :class:`int`
+        The number of samples taken.
+    """
+
+    __slots__ = (
+        "thread_id",
+        "interval",
+        "samples",
+        "_own",
+        "_total",
+        "_stop",
+        "_thread",
+    )
+
+    def __init__(self, thread_id: int, interval: float = 0.005) -> None:
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = 0
+
+        # How many samples had each function on top of the stack, and
+        # anywhere in the stack.
+        self._own: Counter[CodeType] = Counter()
+        self._total: Counter[CodeType] = Counter()
+
+        self._stop = Event()
+        self._thread: Optional[Thread] = None
+
+    def start(self) -> None:
+        """Starts sampling, in a separate thread."""
+        self._stop.clear()
+        self._thread = Thread(
+            target=self._run, name="eris-sampler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stops sampling, waiting for the sampling thread to exit."""
+        self._stop.set()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()  # type: ignore
+            frame: Optional[FrameType] = frames.get(self.thread_id)
+
+            if frame is not None:
+                self._record(frame)
+
+    def _record(self, frame: FrameType) -> None:
+        seen: Set[CodeType] = set()
+        self._own[frame.f_code] += 1
+        self.samples += 1
+
+        current: Optional[FrameType] = frame
+
+        while current is not None:
+            # Recursive functions are only counted once per sample.
+            if current.f_code not in seen:
+                seen.add(current.f_code)
+                self._total[current.f_code] += 1
+
+            current = current.f_back
+
+    def report(self, limit: int = 40) -> str:
+        """Formats the functions seen the most, by the share of samples
+        they were running in (own) or anywhere in the stack (total).
+        """
+        if not self.samples:
+            return "No samples were taken.\n"
+
+        lines = [f"{self.samples} samples, every {self.interval * 1000}ms.\n"]
+
+        for title, counter in (("Own", self._own), ("Total", self._total)):
+            lines.append(f"{title} time:")
+
+            for code, count in counter.most_common(limit):
+                share = count / self.samples
+                lines.append(f"{share:7.1%} {count:7} {_describe(code)}")
+
+            lines.append("")
+
+        return "\n".join(lines)
+
+
+def format_profile(profile: Profile, limit: int = 40) -> str:
+    """Formats the hottest functions of a finished
+    :class:`cProfile.Profile`, by cumulative and by own time.
+    """
+    stream = StringIO()
+    stats = Stats(profile, stream=stream)
+
+    for key in ("cumulative", "tottime"):
+        stats.sort_stats(key).print_stats(limit)
+
+    return stream.getvalue()
+
+
+def format_allocations(
+    before: tracemalloc.Snapshot,
+    after: tracemalloc.Snapshot,
+    limit: int = 25,
+) -> str:
+    """Formats the lines of code that allocated the most memory between
+    two :mod:`tracemalloc` snapshots, and are still holding it.
+    """
+    before = before.filter_traces(_IGNORED_FILES)
+    after = after.filter_traces(_IGNORED_FILES)
+
+    current, peak = tracemalloc.get_traced_memory()
+    lines: List[str] = [
+        f"Traced memory: {current / 1024:.1f} KiB "
+        f"(peak {peak / 1024:.1f} KiB).\n",
+        "Top allocation sites:",
+    ]
+
+    for stat in after.compare_to(before, "lineno")[:limit]:
+        lines.append(str(stat))
+
+    return "\n".join(lines) + "\n"
+
+
+class AllocationTracer:
+    """Traces memory allocations with :mod:`tracemalloc` while active.
+    Tracing is only stopped afterwards if it was started here.
+
+    Tracing covers every thread, so :meth:`start` and :meth:`stop`,
+    which take snapshots of the traced memory, can be called from
+    another thread than the traced code.
+
+    Parameters
+    ----------
+    frames: :class:`int`
+        How many frames to record per allocation.
+    """
+
+    __slots__ = ("frames", "_started", "_before")
+
+    def __init__(self, frames: int = 1) -> None:
+        self.frames = frames
+        self._started = False
+        self._before: Optional[tracemalloc.Snapshot] = None
+
+    def start(self) -> None:
+        """Starts tracing allocations."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started = True
+
+        tracemalloc.reset_peak()
+        self._before = tracemalloc.take_snapshot()
+
+    def stop(self) -> str:
+        """Stops tracing allocations, and formats what was allocated
+        since :meth:`start` with :func:`format_allocations`.
+        """
+        assert self._before is not None
+
+        before, self._before = self._before, None
+        report = format_allocations(before, tracemalloc.take_snapshot())
+
+        if self._started:
+            tracemalloc.stop()
+            self._started = False
+
+        return report
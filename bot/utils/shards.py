@@ -0,0 +1,281 @@
+"""
+Copyright (C) 2023  kyomi
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from asyncio import gather, get_running_loop
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from heapq import nsmallest
+from itertools import chain
+from logging import getLogger
+from multiprocessing import get_context
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar, cast
+
+from bot.utils.inventory import Inventory
+from bot.utils.snapshot import load_snapshot
+
+log = getLogger(__name__)
+
+R = TypeVar("R")
+
+# The inventories mapped by a worker process, keyed by snapshot path,
+# with the generation of the snapshot they come from.
+_mapped: Dict[str, Tuple[int, Inventory]] = {}
+
+
+def _open_shard(path: str, key: str, generation: int) -> Inventory:
+    entry = _mapped.get(path)
+
+    if entry is None or entry[0] != generation:
+        found, cache = load_snapshot(path)
+
+        # The snapshot was replaced since the query was sent, and the
+        # results would not match the inventory of the caller.
+        if found != generation or key not in cache:
+            raise RuntimeError(
+                f"{path} does not hold generation {generation} of "
+                f'the "{key}" source.'
+            )
+
+        _mapped[path] = entry = (found, cache[key])
+
+    return entry[1]
+
+
+def _warm_shard(path: str, key: str, generation: int) -> None:
+    _open_shard(path, key, generation)
+
+
+def _search_shard(
+    path: str,
+    key: str,
+    generation: int,
+    query: str,
+    limit: int,
+    start: int,
+    stop: int,
+    timeout: Optional[float],
+) -> List[Tuple[int, int, str]]:
+    inventory = _open_shard(path, key, generation)
+
+    return cast(
+        List[Tuple[int, int, str]],
+        inventory.index.search(
+            query,
+            raw=True,
+            limit=limit,
+            timeout=timeout,
+            start=start,
+            stop=stop,
+            prefixes=inventory.prefixes,
+        ),
+    )
+
+
+def _release_shard(path: str) -> None:
+    _mapped.pop(path, None)
+
+
+def _ping() -> None:
+    pass
+
+
+class ShardPool:
+    """Persistent worker processes that fuzzy search the snapshots of
+    large sources, each over its own shard of their names.
+
+    A query is sent to every worker, each returns the best results of
+    its shard, and these are merged. Names are unique within a source,
+    so this ranks them exactly like :func:`finder` ranks the whole
+    source.
+
+    Workers map the snapshots themselves, sharing the pages of the file
+    with every other process, so nothing but queries and results goes
+    through pipes. Every shard always goes to the same worker, which
+    keeps the mapping and its part of the file warm between queries.
+
+    Parameters
+    ----------
+    workers: :class:`int`
+        The number of worker processes, and of shards per source.
+    """
+
+    __slots__ = ("workers", "_executors")
+
+    def __init__(self, workers: int) -> None:
+        self.workers = workers
+        self._executors: List[Optional[ProcessPoolExecutor]] = [None] * workers
+
+    def _executor(self, shard: int) -> ProcessPoolExecutor:
+        executor = self._executors[shard]
+
+        if executor is None:
+            # Like the bot's executor, workers are spawned instead of
+            # forked from a process running an event loop.
+            executor = ProcessPoolExecutor(1, mp_context=get_context("spawn"))
+            self._executors[shard] = executor
+
+        return executor
+
+    def _discard(self, shard: int, executor: ProcessPoolExecutor) -> None:
+        # The worker of a broken executor died, and a new one is started
+        # on the next call, unless that was done already.
+        if self._executors[shard] is executor:
+            self._executors[shard] = None
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self, shard: int, func: Callable[..., R], *args: Any) -> R:
+        executor = self._executor(shard)
+        loop = get_running_loop()
+
+        try:
+            return await loop.run_in_executor(executor, func, *args)
+        except BrokenProcessPool:
+            self._discard(shard, executor)
+            raise
+
+    async def start(self) -> None:
+        """Starts every worker, so the first queries don't pay for
+        spawning them.
+        """
+        await gather(
+            *(self._run(shard, _ping) for shard in range(self.workers))
+        )
+
+    def shutdown(self) -> None:
+        """Stops every worker, without waiting for their queries."""
+        for executor in self._executors:
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+        self._executors = [None] * self.workers
+
+    def warm(self, path: str, key: str, generation: int) -> None:
+        """Has every worker map a snapshot in the background, so the
+        first query of the source doesn't pay for it.
+
+        Parameters
+        ----------
+        path: :class:`str`
+            The path of the snapshot.
+        key: :class:`str`
+            The key of the source in the snapshot.
+        generation: :class:`int`
+            The generation of the snapshot.
+        """
+
+        def done(future: "Future[None]") -> None:
+            # A snapshot replaced in the meantime is simply warmed with
+            # its next generation.
+            if not future.cancelled() and future.exception() is not None:
+                log.debug(f"Could not warm {path}.", exc_info=True)
+
+        for shard in range(self.workers):
+            executor = self._executor(shard)
+
+            try:
+                future = executor.submit(_warm_shard, path, key, generation)
+            except (BrokenProcessPool, RuntimeError):
+                self._discard(shard, executor)
+            else:
+                future.add_done_callback(done)
+
+    def release(self, path: str) -> None:
+        """Has every worker unmap a snapshot, e.g. once its source is
+        unloaded.
+
+        Parameters
+        ----------
+        path: :class:`str`
+            The path of the snapshot.
+        """
+        for shard, executor in enumerate(self._executors):
+            if executor is None:
+                continue
+
+            try:
+                executor.submit(_release_shard, path)
+            except (BrokenProcessPool, RuntimeError):
+                self._discard(shard, executor)
+
+    async def search(
+        self,
+        path: str,
+        key: str,
+        generation: int,
+        size: int,
+        query: str,
+        *,
+        limit: int,
+        timeout: Optional[float] = None,
+    ) -> List[Tuple[int, int, str]]:
+        """Fuzzy searches the index of a source, like
+        :meth:`FuzzyIndex.search` does with ``raw=True``.
+
+        Parameters
+        ----------
+        path: :class:`str`
+            The path of the snapshot holding the source.
+        key: :class:`str`
+            The key of the source in the snapshot.
+        generation: :class:`int`
+            The generation of the snapshot the caller searches.
+        size: :class:`int`
+            The number of names in the index.
+        query: :class:`str`
+            The text to search for.
+        limit: :class:`int`
+            The maximum number of results to return.
+        timeout: Optional[:class:`float`]
+            How long, in seconds, each shard may be searched for.
+
+        Returns
+        -------
+        List[Tuple[:class:`int`, :class:`int`, :class:`str`]]
+            The best results, as (span, start, name) tuples.
+
+        Raises
+        ------
+        RuntimeError
+            The snapshot does not hold that generation anymore.
+        BrokenProcessPool
+            A worker died. It's started again on the next query.
+        """
+        step = -(-size // self.workers)
+
+        # Small sources don't fill every shard, and the last ones are
+        # left empty instead of being searched.
+        parts = await gather(
+            *(
+                self._run(
+                    shard,
+                    _search_shard,
+                    path,
+                    key,
+                    generation,
+                    query,
+                    limit,
+                    shard * step,
+                    min((shard + 1) * step, size),
+                    timeout,
+                )
+                for shard in range(self.workers)
+                if shard * step < size
+            )
+        )
+
+        # Names are unique, so ties are broken by name like finder does.
+        return nsmallest(limit, chain.from_iterable(parts))
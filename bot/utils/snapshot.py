@@ -0,0 +1,490 @@
+"""
+Copyright (C) 2023  kyomi
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from array import array
+from contextlib import suppress
+from fcntl import LOCK_EX, flock
+from itertools import chain
+from mmap import ACCESS_READ, mmap
+from os import chmod, replace, umask, unlink
+from os.path import basename, dirname
+from struct import Struct, error
+from tempfile import mkstemp
+from typing import Any, Dict, Iterable, List, Mapping, Sequence, Tuple
+
+from bot.utils.diff import InventoryDelta
+from bot.utils.fuzzy import MappedFuzzyIndex
+from bot.utils.inventory import Inventory
+from bot.utils.prefix import PrefixIndex
+from bot.utils.table import LookupTable
+from bot.utils.typo import TypoIndex
+from bot.utils.views import BitsetView, Buffer, StringView, TextView
+
+SNAPSHOT_MAGIC = b"ERISRTFM"
+SNAPSHOT_VERSION = 6
+
+# Magic, format version, generation and number of sources.
+_HEADER = Struct("<8sHQI")
+# Lengths of the name, entity tag and last modification date, and the
+# timestamp of a source. An empty string stands for a missing value.
+_SOURCE = Struct("<HHHd")
+# Number of entries, pages, keys scored with a regular expression and
+# postings of a source.
+_COUNTS = Struct("<IIII")
+# Number of words, word postings, deletions and deletion postings of
+# the typo index of a source.
+_TYPOS = Struct("<IIII")
+# Number of URLs, removed names and added names of the delta of a
+# source.
+_DELTA = Struct("<III")
+# Character length and bitset length of a posting.
+_POSTING = Struct("<HI")
+_LENGTH = Struct("<I")
+
+# Arrays start at a multiple of their item size, so they can be read in
+# place.
+_ALIGNMENT = array("I").itemsize
+
+# The umask can only be read by setting it, which is done once here, as
+# snapshots are written from other threads.
+_UMASK = umask(0o022)
+umask(_UMASK)
+
+
+class _Writer:
+    __slots__ = ("parts", "offset")
+
+    def __init__(self) -> None:
+        self.parts: List[bytes] = []
+        self.offset = 0
+
+    def write(self, data: bytes) -> None:
+        self.parts.append(data)
+        self.offset += len(data)
+
+    def pack(self, struct: Struct, *values: Any) -> None:
+        self.write(struct.pack(*values))
+
+    def align(self) -> None:
+        padding = -self.offset % _ALIGNMENT
+
+        if padding:
+            self.write(bytes(padding))
+
+    def write_array(self, values: Iterable[int]) -> None:
+        self.align()
+
+        if isinstance(values, memoryview):
+            # Read from a snapshot already, so copied as is.
+            self.write(values.tobytes())
+        else:
+            self.write(array("I", values).tobytes())
+
+    def write_text(self, offsets: Sequence[int], data: bytes) -> None:
+        self.write_array(offsets)
+        self.write(data)
+
+    def write_strings(self, strings: Iterable[str]) -> None:
+        if isinstance(strings, StringView) and strings.order is None:
+            # Strings read from a snapshot are copied without decoding
+            # them, which makes writing an unchanged source cheap.
+            base, offsets = strings.base, strings.offsets
+            self.write_text(offsets, strings.buffer[base : base + offsets[-1]])
+            return
+
+        # The offsets of the strings, followed by the strings.
+        encoded = [string.encode("utf-8") for string in strings]
+        offsets = array("I", [0])
+
+        for data in encoded:
+            offsets.append(offsets[-1] + len(data))
+
+        self.write_text(offsets, b"".join(encoded))
+
+
+class _Reader:
+    __slots__ = ("buffer", "data", "offset")
+
+    def __init__(self, buffer: Buffer, offset: int = 0) -> None:
+        self.buffer = buffer
+        self.data = memoryview(buffer)
+        self.offset = offset
+
+    def unpack(self, struct: Struct) -> Tuple[Any, ...]:
+        values = struct.unpack_from(self.data, self.offset)
+        self.offset += struct.size
+        return values
+
+    def read(self, size: int) -> memoryview:
+        data = self.data[self.offset : self.offset + size]
+
+        if len(data) != size:
+            raise RuntimeError("Invalid snapshot file, truncated data.")
+
+        self.offset += size
+        return data
+
+    def read_str(self, size: int) -> str:
+        return str(self.read(size), "utf-8")
+
+    def align(self) -> None:
+        self.offset += -self.offset % _ALIGNMENT
+
+    def read_array(self, count: int) -> Sequence[int]:
+        self.align()
+        return self.read(count * _ALIGNMENT).cast("I")
+
+    def read_strings(
+        self, count: int, order: Sequence[int] | None = None
+    ) -> StringView:
+        offsets = self.read_array(count + 1)
+
+        if offsets[0] != 0 or any(a > b for a, b in zip(offsets, offsets[1:])):
+            raise RuntimeError("Invalid snapshot file, mismatched entries.")
+
+        base = self.offset
+        self.read(offsets[-1])
+
+        return StringView(self.buffer, base, offsets, order)
+
+
+def _dump_inventory(writer: _Writer, name: str, inventory: Inventory) -> None:
+    table = inventory.table
+    index = inventory.index
+    postings = index.postings
+
+    encoded = name.encode("utf-8")
+    etag = (inventory.etag or "").encode("utf-8")
+    last_modified = (inventory.last_modified or "").encode("utf-8")
+    anchors = table.anchors
+    offsets = table.offsets
+
+    writer.pack(
+        _SOURCE,
+        len(encoded),
+        len(etag),
+        len(last_modified),
+        inventory.timestamp,
+    )
+    writer.write(encoded)
+    writer.write(etag)
+    writer.write(last_modified)
+    writer.pack(
+        _COUNTS, len(table), len(table.pages), len(index.other), len(postings)
+    )
+
+    writer.write_strings(table.names)
+    writer.write_strings(index.folded)
+    writer.write_strings(table.pages)
+    writer.write_array(table.page_ids)
+
+    if isinstance(anchors, TextView):
+        writer.write_text(offsets, anchors.data.tobytes())
+    else:
+        writer.write_strings(
+            anchors[offsets[i] : offsets[i + 1]] for i in range(len(table))
+        )
+
+    writer.write_array(inventory.prefixes.order)
+    writer.write_array(index.other)
+
+    size = (len(table) + 7) // 8
+
+    for char, mask in chain(postings.items(), (("", index.plain),)):
+        data = char.encode("utf-8")
+
+        writer.pack(_POSTING, len(data), size)
+        writer.write(data)
+        writer.write(mask.to_bytes(size, "little"))
+
+    typos = inventory.typos
+
+    writer.align()
+    writer.pack(
+        _TYPOS,
+        len(typos.words),
+        len(typos.entries),
+        len(typos.deletes),
+        len(typos.origins),
+    )
+    writer.write_strings(typos.words)
+    writer.write_array(typos.postings)
+    writer.write_array(typos.entries)
+    writer.write_strings(typos.deletes)
+    writer.write_array(typos.sources)
+    writer.write_array(typos.origins)
+
+    delta = inventory.delta or InventoryDelta({}, set(), [])
+    urls = delta.urls
+    removed = sorted(delta.removed)
+    added = delta.names
+
+    writer.align()
+    writer.pack(_DELTA, len(urls), len(removed), len(added))
+    writer.write_strings(urls)
+    writer.write_strings(urls.values())
+    writer.write_strings(removed)
+    writer.write_strings(added)
+
+
+def _load_delta(reader: _Reader) -> InventoryDelta | None:
+    reader.align()
+    url_count, removed_count, added_count = reader.unpack(_DELTA)
+
+    names = reader.read_strings(url_count)
+    urls = reader.read_strings(url_count)
+    removed = reader.read_strings(removed_count)
+    added = reader.read_strings(added_count)
+
+    if not url_count and not removed_count:
+        return None
+
+    # Deltas are small, so they're read back into memory, along with
+    # the indexes over their names.
+    return InventoryDelta(dict(zip(names, urls)), set(removed), list(added))
+
+
+def _load_inventory(reader: _Reader) -> Tuple[str, Inventory]:
+    name_size, etag_size, last_modified_size, timestamp = reader.unpack(
+        _SOURCE
+    )
+    name = reader.read_str(name_size)
+    etag = reader.read_str(etag_size)
+    last_modified = reader.read_str(last_modified_size)
+
+    entries, page_count, other_count, count = reader.unpack(_COUNTS)
+
+    names = reader.read_strings(entries)
+    folded = reader.read_strings(entries)
+    pages = reader.read_strings(page_count)
+    page_ids = reader.read_array(entries)
+    anchors = reader.read_strings(entries)
+    order = reader.read_array(entries)
+    other = reader.read_array(other_count)
+
+    bitsets: Dict[str, memoryview] = {}
+
+    # The bitset of every plain key comes last, under an empty string.
+    for _ in range(count + 1):
+        char_size, bitset_size = reader.unpack(_POSTING)
+        char = reader.read_str(char_size)
+        bitsets[char] = reader.read(bitset_size)
+
+    plain = int.from_bytes(bitsets.pop(""), "little")
+
+    reader.align()
+    word_count, entry_count, delete_count, origin_count = reader.unpack(_TYPOS)
+    typos = TypoIndex.from_parts(
+        names,
+        reader.read_strings(word_count),
+        reader.read_array(word_count + 1),
+        reader.read_array(entry_count),
+        reader.read_strings(delete_count),
+        reader.read_array(delete_count + 1),
+        reader.read_array(origin_count),
+    )
+    delta = _load_delta(reader)
+
+    # The anchors are read as a single text, sliced by the table.
+    size = anchors.offsets[-1]
+    text = TextView(reader.data[anchors.base : anchors.base + size])
+
+    table = LookupTable.from_parts(
+        names, pages, page_ids, text, anchors.offsets
+    )
+    index = MappedFuzzyIndex.from_parts(
+        names, names, folded, BitsetView(bitsets), plain, other
+    )
+    prefixes = PrefixIndex.from_parts(
+        names,
+        StringView(folded.buffer, folded.base, folded.offsets, order),
+        order,
+    )
+
+    inventory = Inventory(
+        table,
+        index,
+        timestamp,
+        etag=etag or None,
+        last_modified=last_modified or None,
+        prefixes=prefixes,
+        typos=typos,
+        delta=delta,
+    )
+    return name, inventory
+
+
+def dump_snapshot(
+    path: str, inventories: Mapping[str, Inventory], generation: int
+) -> int:
+    """Writes the given inventories to a snapshot file, so they can be
+    mapped back into memory with :func:`load_snapshot`.
+
+    The file is replaced atomically, and never modified in place, so
+    processes still mapping the previous version of it keep reading a
+    consistent copy, until they switch to the new one. Every process of
+    the host may write the same snapshot: writers hold a lock on a
+    ``.lock`` file next to it while picking the generation and replacing
+    the file, so each write gets its own generation.
+
+    Parameters
+    ----------
+    path: :class:`str`
+        The path of the snapshot file.
+    inventories: Mapping[:class:`str`, :class:`Inventory`]
+        The inventories to store, keyed by source name.
+    generation: :class:`int`
+        The lowest generation to write, see
+        :func:`read_snapshot_generation`. The snapshot gets a higher one
+        if the current file has this generation or a later one.
+
+    Returns
+    -------
+    :class:`int`
+        The generation of the written snapshot.
+    """
+    writer = _Writer()
+    # The generation is only known once the lock is held, and the header
+    # is packed again then.
+    writer.pack(_HEADER, SNAPSHOT_MAGIC, SNAPSHOT_VERSION, 0, len(inventories))
+
+    for name, inventory in inventories.items():
+        writer.align()
+        _dump_inventory(writer, name, inventory)
+
+    # The lock is released when the file is closed.
+    with open(f"{path}.lock", "wb") as lock:
+        flock(lock, LOCK_EX)
+
+        try:
+            latest = read_snapshot_generation(path)
+        except (FileNotFoundError, RuntimeError):
+            latest = 0
+
+        generation = max(generation, latest + 1)
+        writer.parts[0] = _HEADER.pack(
+            SNAPSHOT_MAGIC, SNAPSHOT_VERSION, generation, len(inventories)
+        )
+
+        fd, temp = mkstemp(
+            suffix=".tmp", prefix=f"{basename(path)}.", dir=dirname(path)
+        )
+
+        try:
+            with open(fd, "wb") as file:
+                file.writelines(writer.parts)
+
+            # Temporary files are only readable by their owner, while
+            # the snapshot is shared like any file created here.
+            chmod(temp, 0o666 & ~_UMASK)
+            replace(temp, path)
+        except BaseException:
+            with suppress(OSError):
+                unlink(temp)
+
+            raise
+
+    return generation
+
+
+def _read_header(data: Any) -> Tuple[int, int]:
+    magic, version, generation, count = _HEADER.unpack_from(data)
+
+    if magic != SNAPSHOT_MAGIC:
+        raise RuntimeError("Invalid snapshot file.")
+
+    if version != SNAPSHOT_VERSION:
+        raise RuntimeError("Invalid snapshot file version.")
+
+    return generation, count
+
+
+def read_snapshot_generation(path: str) -> int:
+    """Reads the generation of a snapshot file, without loading it.
+
+    Parameters
+    ----------
+    path: :class:`str`
+        The path of the snapshot file.
+
+    Returns
+    -------
+    :class:`int`
+        The generation of the snapshot.
+
+    Raises
+    ------
+    OSError
+        The snapshot file could not be read.
+    RuntimeError
+        The snapshot file is invalid or was written by another version.
+    """
+    with open(path, "rb") as file:
+        data = file.read(_HEADER.size)
+
+    try:
+        generation, _ = _read_header(data)
+    except error as exc:
+        raise RuntimeError("Invalid snapshot file, truncated data.") from exc
+
+    return generation
+
+
+def load_snapshot(path: str) -> Tuple[int, Dict[str, Inventory]]:
+    """Maps a snapshot file written by :func:`dump_snapshot` into
+    memory.
+
+    Nothing is copied out of the file: the returned inventories read
+    their entries straight from the mapping, which is shared with every
+    other process mapping the same file, and stays valid until they're
+    garbage collected, even if the file is replaced in the meantime.
+
+    Parameters
+    ----------
+    path: :class:`str`
+        The path of the snapshot file.
+
+    Returns
+    -------
+    Tuple[:class:`int`, Dict[:class:`str`, :class:`Inventory`]]
+        The generation of the snapshot, and the stored inventories,
+        keyed by source name.
+
+    Raises
+    ------
+    OSError
+        The snapshot file could not be read.
+    RuntimeError
+        The snapshot file is invalid or was written by another version.
+    """
+    try:
+        with open(path, "rb") as file:
+            buffer = mmap(file.fileno(), 0, access=ACCESS_READ)
+
+        generation, count = _read_header(buffer)
+
+        reader = _Reader(buffer, _HEADER.size)
+        result: Dict[str, Inventory] = {}
+
+        for _ in range(count):
+            reader.align()
+            name, inventory = _load_inventory(reader)
+            result[name] = inventory
+    except (error, TypeError, ValueError) as exc:
+        raise RuntimeError("Invalid snapshot file, truncated data.") from exc
+
+    return generation, result
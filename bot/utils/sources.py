@@ -0,0 +1,294 @@
+"""
+Copyright (C) 2023  kyomi
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import re
+import tomllib
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple, cast
+
+# Formats of the inventories, either a Sphinx objects.inv file or the
+# JSON manifest of the discord.js documentation.
+SOURCE_FORMATS = ("sphinx", "json")
+
+# Source keys are used as file and directory names.
+_KEY = re.compile(r"^[a-z0-9_-]+$")
+
+_SOURCE_FIELDS = frozenset(
+    (
+        "name",
+        "url",
+        "inventory",
+        "format",
+        "refresh_interval",
+        "preload",
+        "aliases",
+    )
+)
+
+
+class RTFMSource:
+    """A documentation website that can be searched with RTFM.
+
+    Parameters
+    ----------
+    key: :class:`str`
+        The unique name of the source, used in commands and file names.
+    name: :class:`str`
+        The name of the documented project, as shown to users.
+    url: :class:`str`
+        The URL of the documentation, which the links of the inventory
+        are relative to.
+    inventory: :class:`str`
+        The URL of the inventory of the documentation.
+    format: :class:`str`
+        The format of the inventory, one of :data:`SOURCE_FORMATS`.
+    refresh_interval: :class:`int`
+        How often, in seconds, the source is fetched again while it's
+        loaded.
+    preload: :class:`bool`
+        Whether the source is loaded at startup and kept loaded, instead
+        of being loaded on its first lookup.
+    aliases: Tuple[:class:`str`, ...]
+        Other names the source can be looked up with.
+    """
+
+    __slots__ = (
+        "key",
+        "name",
+        "url",
+        "inventory",
+        "format",
+        "refresh_interval",
+        "preload",
+        "aliases",
+    )
+
+    def __init__(
+        self,
+        key: str,
+        name: str,
+        url: str,
+        inventory: str,
+        format: str,
+        refresh_interval: int,
+        preload: bool,
+        aliases: Tuple[str, ...] = (),
+    ) -> None:
+        self.key = key
+        self.name = name
+        self.url = url
+        self.inventory = inventory
+        self.format = format
+        self.refresh_interval = refresh_interval
+        self.preload = preload
+        self.aliases = aliases
+
+    @property
+    def path(self) -> str:
+        """The path of the inventory in a mirror directory, e.g.
+        ``stable/objects.inv``.
+        """
+        return f"{self.key}/{self.inventory.rsplit('/', 1)[-1]}"
+
+
+class SourceStats:
+    """How a source was used since the bot started.
+
+    Attributes
+    ----------
+    loads: :class:`int`
+        How many times the source was loaded, from its snapshot or from
+        the documentation website.
+    evictions: :class:`int`
+        How many times the source was unloaded to stay under the memory
+        budget.
+    load_time: :class:`float`
+        How long, in seconds, the last load took.
+    lookups: :class:`int`
+        How many lookups the source answered.
+    last_used: :class:`float`
+        When the source was last looked up, as a UNIX timestamp, or
+        ``0.0`` if it never was.
+    size: :class:`int`
+        The size of the snapshot of the source, in bytes, or ``0`` if it
+        was never written.
+    """
+
+    __slots__ = (
+        "loads",
+        "evictions",
+        "load_time",
+        "lookups",
+        "last_used",
+        "size",
+    )
+
+    def __init__(self) -> None:
+        self.loads = 0
+        self.evictions = 0
+        self.load_time = 0.0
+        self.lookups = 0
+        self.last_used = 0.0
+        self.size = 0
+
+
+def _get(
+    table: Mapping[str, Any], field: str, kind: type, default: Any, where: str
+) -> Any:
+    value = table.get(field, default)
+
+    # Booleans are integers as well, but never a valid one here.
+    if not isinstance(value, kind) or (
+        kind is int and isinstance(value, bool)
+    ):
+        raise ValueError(f'Invalid "{field}" for {where}.')
+
+    return value
+
+
+def _parse_source(key: str, table: Mapping[str, Any]) -> RTFMSource:
+    where = f'the "{key}" RTFM source'
+
+    if not _KEY.match(key):
+        raise ValueError(f'Invalid RTFM source name "{key}".')
+
+    unknown = table.keys() - _SOURCE_FIELDS
+
+    if unknown:
+        raise ValueError(f"Unknown fields {sorted(unknown)} for {where}.")
+
+    if "url" not in table:
+        raise ValueError(f'Missing "url" for {where}.')
+
+    url: str = _get(table, "url", str, None, where).rstrip("/")
+    inventory = _get(table, "inventory", str, f"{url}/objects.inv", where)
+    format = _get(table, "format", str, "sphinx", where)
+    interval = _get(table, "refresh_interval", int, 24 * 60 * 60, where)
+    aliases: List[Any] = _get(table, "aliases", list, [], where)
+
+    if format not in SOURCE_FORMATS:
+        choices = ", ".join(SOURCE_FORMATS)
+        raise ValueError(f'Invalid "format" for {where}, use {choices}.')
+
+    if interval <= 0:
+        raise ValueError(f'Invalid "refresh_interval" for {where}.')
+
+    if not all(isinstance(alias, str) for alias in aliases):
+        raise ValueError(f'Invalid "aliases" for {where}.')
+
+    return RTFMSource(
+        key,
+        _get(table, "name", str, key, where),
+        url,
+        inventory,
+        format,
+        interval,
+        _get(table, "preload", bool, False, where),
+        tuple(alias.lower() for alias in aliases),
+    )
+
+
+class SourceRegistry(Mapping[str, RTFMSource]):
+    """The RTFM sources, keyed by name, in the order they're configured.
+
+    Parameters
+    ----------
+    sources: Dict[:class:`str`, :class:`RTFMSource`]
+        The sources, keyed by name.
+    memory_budget: :class:`int`
+        How many bytes the loaded sources may take, see
+        :class:`SourceStats`.
+
+    Raises
+    ------
+    ValueError
+        Two sources share a name or an alias.
+    """
+
+    __slots__ = ("sources", "memory_budget", "_names")
+
+    def __init__(
+        self, sources: Dict[str, RTFMSource], memory_budget: int
+    ) -> None:
+        self.sources = sources
+        self.memory_budget = memory_budget
+        self._names: Dict[str, str] = {}
+
+        for key, source in sources.items():
+            for name in (key, *source.aliases):
+                if name in self._names:
+                    raise ValueError(f'Duplicate RTFM source name "{name}".')
+
+                self._names[name] = key
+
+    @classmethod
+    def from_file(cls, path: str) -> "SourceRegistry":
+        """Reads the sources from a TOML file, with a ``sources`` table
+        holding a table per source, and the memory budget in MiB.
+
+        Parameters
+        ----------
+        path: :class:`str`
+            The path of the file.
+
+        Returns
+        -------
+        :class:`SourceRegistry`
+            The configured sources.
+
+        Raises
+        ------
+        ValueError
+            The file is not valid TOML, or a source is invalid.
+        """
+        with open(path, "rb") as file:
+            try:
+                config = tomllib.load(file)
+            except tomllib.TOMLDecodeError as exc:
+                raise ValueError(f"Invalid RTFM sources file {path}.") from exc
+
+        where = "the RTFM sources"
+        budget = _get(config, "memory_budget", int, 256, where)
+        tables: Dict[str, Any] = _get(config, "sources", dict, {}, where)
+
+        if budget <= 0:
+            raise ValueError(f'Invalid "memory_budget" for {where}.')
+
+        sources: Dict[str, RTFMSource] = {}
+
+        for key, table in tables.items():
+            if not isinstance(table, dict):
+                raise ValueError(f'Invalid RTFM source "{key}".')
+
+            sources[key] = _parse_source(key, cast(Dict[str, Any], table))
+
+        return cls(sources, budget * 1024 * 1024)
+
+    def resolve(self, name: str) -> Optional[RTFMSource]:
+        """Returns the source with the given name or alias, ignoring
+        case, or ``None`` if there is none.
+        """
+        key = self._names.get(name.lower())
+        return None if key is None else self.sources[key]
+
+    def __getitem__(self, key: str) -> RTFMSource:
+        return self.sources[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.sources)
+
+    def __len__(self) -> int:
+        return len(self.sources)
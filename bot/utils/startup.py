@@ -0,0 +1,99 @@
+"""
+Copyright (C) 2023  kyomi
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from logging import getLogger
+from time import perf_counter
+from typing import Dict, List, Optional, Tuple
+
+log = getLogger(__name__)
+
+
+class StartupTimer:
+    """Times the phases of the startup of the bot, which may overlap,
+    and logs a breakdown once :meth:`complete` was called and every
+    phase that was started is over.
+
+    Parameters
+    ----------
+    started: Optional[:class:`float`]
+        When the startup began, as returned by
+        :func:`time.perf_counter`. Defaults to ``None``, which means
+        now.
+
+    Attributes
+    ----------
+    finished: :class:`bool`
+        Whether the breakdown was logged already. Phases begun after
+        that are ignored, e.g. when an extension is reloaded.
+    """
+
+    __slots__ = ("started", "finished", "_complete", "_phases")
+
+    def __init__(self, started: Optional[float] = None) -> None:
+        self.started = perf_counter() if started is None else started
+        self.finished = False
+        self._complete = False
+
+        # When each phase began and ended, relative to the startup.
+        self._phases: Dict[str, Tuple[float, Optional[float]]] = {}
+
+    def begin(self, phase: str) -> None:
+        """Marks the beginning of a phase."""
+        if not self.finished and phase not in self._phases:
+            self._phases[phase] = (perf_counter() - self.started, None)
+
+    def end(self, phase: str) -> None:
+        """Marks the end of a phase."""
+        if self.finished or phase not in self._phases:
+            return
+
+        began, ended = self._phases[phase]
+
+        if ended is None:
+            self._phases[phase] = (began, perf_counter() - self.started)
+
+        self._check()
+
+    def complete(self) -> None:
+        """Marks that no other phase will begin. The breakdown is logged
+        once the phases still running are over.
+        """
+        self._complete = True
+        self._check()
+
+    def _check(self) -> None:
+        if self.finished or not self._complete:
+            return
+
+        if all(ended is not None for _, ended in self._phases.values()):
+            self.finished = True
+            log.info(self.report())
+
+    def report(self) -> str:
+        """Formats how long each phase took, in the order they began."""
+        parts: List[str] = []
+        total = 0.0
+
+        for phase, (began, ended) in self._phases.items():
+            if ended is None:
+                parts.append(f"{phase} (running since {began:.2f}s)")
+                continue
+
+            total = max(total, ended)
+            parts.append(f"{phase} {ended - began:.2f}s (at {ended:.2f}s)")
+
+        return f"Startup took {total:.2f}s: {', '.join(parts)}."
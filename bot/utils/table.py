@@ -0,0 +1,138 @@
+"""
+Copyright (C) 2023  kyomi
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterator, List, Mapping, Sequence
+
+from bot.utils.views import TextView
+
+
+class LookupTable(Mapping[str, str]):
+    """A compact, read-only mapping from entity names to documentation
+    URLs.
+
+    Documentation URLs repeat the same few pages over and over, so each
+    URL is split at its fragment: the part before it is stored once in
+    a page table, and only the fragments are kept per entry, packed in
+    a single string. Names are kept in a sorted list and looked up with
+    a binary search, and full URLs are only built when asked for.
+
+    Parameters
+    ----------
+    entries: Mapping[:class:`str`, :class:`str`]
+        The entries of the table, mapping names to URLs.
+
+    Attributes
+    ----------
+    names: Sequence[:class:`str`]
+        The sorted names of the entries.
+    pages: Sequence[:class:`str`]
+        The distinct URLs of the pages, without fragments.
+    page_ids: Sequence[:class:`int`]
+        The index in :attr:`pages` of the page of each entry.
+    anchors: :class:`str` | :class:`TextView`
+        The fragments of every entry (including the ``#``), one after
+        the other.
+    offsets: Sequence[:class:`int`]
+        Where the fragment of each entry starts in :attr:`anchors`,
+        followed by the length of :attr:`anchors`.
+    """
+
+    __slots__ = ("names", "pages", "page_ids", "anchors", "offsets")
+
+    def __init__(self, entries: Mapping[str, str]) -> None:
+        names = sorted(entries)
+        pages: List[str] = []
+        page_ids = array("I")
+        offsets = array("I", [0])
+
+        known: Dict[str, int] = {}
+        anchors: List[str] = []
+        offset = 0
+
+        for name in names:
+            page, sep, anchor = entries[name].partition("#")
+            page_id = known.get(page)
+
+            if page_id is None:
+                page_id = known[page] = len(pages)
+                pages.append(page)
+
+            anchor = sep + anchor
+            offset += len(anchor)
+
+            anchors.append(anchor)
+            page_ids.append(page_id)
+            offsets.append(offset)
+
+        self.names: Sequence[str] = names
+        self.pages: Sequence[str] = pages
+        self.page_ids: Sequence[int] = page_ids
+        self.anchors: str | TextView = "".join(anchors)
+        self.offsets: Sequence[int] = offsets
+
+    @classmethod
+    def from_parts(
+        cls,
+        names: Sequence[str],
+        pages: Sequence[str],
+        page_ids: Sequence[int],
+        anchors: str | TextView,
+        offsets: Sequence[int],
+    ) -> "LookupTable":
+        """Creates a table from the attributes of another one, e.g. when
+        loading it back from a snapshot. These can be views over a
+        memory-mapped file.
+        """
+        self = cls.__new__(cls)
+
+        self.names = names
+        self.pages = pages
+        self.page_ids = page_ids
+        self.anchors = anchors
+        self.offsets = offsets
+
+        return self
+
+    def url(self, i: int) -> str:
+        """Builds the URL of the entry at the given position of
+        :attr:`names`.
+        """
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.pages[self.page_ids[i]] + self.anchors[start:end]
+
+    def __getitem__(self, name: str) -> str:
+        i = bisect_left(self.names, name)
+
+        if i == len(self.names) or self.names[i] != name:
+            raise KeyError(name)
+
+        return self.url(i)
+
+    def __contains__(self, name: object) -> bool:
+        if not isinstance(name, str):
+            return False
+
+        i = bisect_left(self.names, name)
+        return i != len(self.names) and self.names[i] == name
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.names)
+
+    def __len__(self) -> int:
+        return len(self.names)
@@ -0,0 +1,306 @@
+"""
+Copyright (C) 2023  kyomi
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import re
+from array import array
+from bisect import bisect_left
+from heapq import nsmallest
+from time import perf_counter
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+# Names are split into words at anything that is not a letter, a digit
+# or an underscore, e.g. dots and colons.
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Splits a name or a query into lowercase words."""
+    return _TOKEN.findall(text.lower())
+
+
+def distance(a: str, b: str, bound: int) -> int:
+    """Computes the optimal string alignment distance between two
+    strings: the number of insertions, deletions, substitutions and
+    transpositions of adjacent characters needed to turn one into the
+    other.
+
+    Any distance over ``bound`` is returned as ``bound + 1``, which lets
+    the computation stop early.
+    """
+    if abs(len(a) - len(b)) > bound:
+        return bound + 1
+
+    previous: List[int] = []
+    current = list(range(len(b) + 1))
+
+    for i, x in enumerate(a, 1):
+        before, previous, current = previous, current, [i] * (len(b) + 1)
+
+        for j, y in enumerate(b, 1):
+            cost = previous[j - 1] + (x != y)
+            cost = min(cost, previous[j] + 1, current[j - 1] + 1)
+
+            if i > 1 and j > 1 and x == b[j - 2] and a[i - 2] == y:
+                cost = min(cost, before[j - 2] + 1)
+
+            current[j] = cost
+
+        if min(current) > bound:
+            return bound + 1
+
+    return min(current[-1], bound + 1)
+
+
+def _deletes(word: str, count: int) -> Set[str]:
+    # Every non-empty string obtained by deleting up to the given number
+    # of characters from the word.
+    found = {word}
+    layer = {word}
+
+    for _ in range(count):
+        layer = {
+            part[:i] + part[i + 1 :]
+            for part in layer
+            if len(part) > 1
+            for i in range(len(part))
+        }
+        found |= layer
+
+    return found
+
+
+class TypoIndex:
+    """A typo-tolerant index over a sequence of names, to suggest names
+    when a query has no subsequence match at all.
+
+    Names are split into words, and the distinct words are indexed like
+    SymSpell does: every string obtained by deleting up to
+    :attr:`MAX_TYPOS` characters from the start of a word points back
+    to it. Two words within ``k`` typos of each other always share such
+    a string, so a query word only looks up its own deletions, a few
+    binary searches, instead of being compared with every word.
+
+    Everything is kept in sorted or flat arrays, so the index can be
+    stored in a snapshot and read in place.
+
+    Parameters
+    ----------
+    names: Sequence[:class:`str`]
+        The names to index, like the names of a :class:`LookupTable`.
+
+    Attributes
+    ----------
+    names: Sequence[:class:`str`]
+        The indexed names.
+    words: Sequence[:class:`str`]
+        The distinct words of the names, in alphabetical order.
+    postings: Sequence[:class:`int`]
+        Where the names containing each word start in :attr:`entries`,
+        followed by the length of :attr:`entries`.
+    entries: Sequence[:class:`int`]
+        The indices of the names containing each word, one word after
+        the other.
+    deletes: Sequence[:class:`str`]
+        The deletions of the words, in alphabetical order.
+    sources: Sequence[:class:`int`]
+        Where the words each deletion comes from start in
+        :attr:`origins`, followed by the length of :attr:`origins`.
+    origins: Sequence[:class:`int`]
+        The indices of the words each deletion comes from, one deletion
+        after the other.
+    """
+
+    __slots__ = (
+        "names",
+        "words",
+        "postings",
+        "entries",
+        "deletes",
+        "sources",
+        "origins",
+    )
+
+    # The most typos a query word may have.
+    MAX_TYPOS = 2
+    # How many characters of each word are indexed. Longer words are
+    # matched on this prefix, and checked in full afterwards.
+    PREFIX_LENGTH = 7
+
+    def __init__(self, names: Sequence[str]) -> None:
+        found: Dict[str, List[int]] = {}
+
+        for i, name in enumerate(names):
+            for word in set(tokenize(name)):
+                found.setdefault(word, []).append(i)
+
+        words = sorted(found)
+        postings = array("I", [0])
+        entries = array("I")
+        deletions: Dict[str, List[int]] = {}
+
+        for w, word in enumerate(words):
+            entries.extend(found[word])
+            postings.append(len(entries))
+
+            prefix = word[: self.PREFIX_LENGTH]
+
+            for part in _deletes(prefix, self.MAX_TYPOS):
+                deletions.setdefault(part, []).append(w)
+
+        deletes = sorted(deletions)
+        sources = array("I", [0])
+        origins = array("I")
+
+        for part in deletes:
+            origins.extend(deletions[part])
+            sources.append(len(origins))
+
+        self.names = names
+        self.words: Sequence[str] = words
+        self.postings: Sequence[int] = postings
+        self.entries: Sequence[int] = entries
+        self.deletes: Sequence[str] = deletes
+        self.sources: Sequence[int] = sources
+        self.origins: Sequence[int] = origins
+
+    @classmethod
+    def from_parts(
+        cls,
+        names: Sequence[str],
+        words: Sequence[str],
+        postings: Sequence[int],
+        entries: Sequence[int],
+        deletes: Sequence[str],
+        sources: Sequence[int],
+        origins: Sequence[int],
+    ) -> "TypoIndex":
+        """Creates an index from the attributes of another one, e.g.
+        when loading it back from a snapshot. These can be views over a
+        memory-mapped file.
+        """
+        self = cls.__new__(cls)
+
+        self.names = names
+        self.words = words
+        self.postings = postings
+        self.entries = entries
+        self.deletes = deletes
+        self.sources = sources
+        self.origins = origins
+
+        return self
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def _similar(
+        self, word: str, bound: int, deadline: Optional[float]
+    ) -> Dict[int, int]:
+        # Returns the words within the given distance of this one, with
+        # their distance. Words next to an exact match are kept too, as
+        # the names holding it may be outranked or, in an inventory with
+        # a delta, removed, and every index must rank its names like an
+        # index over all of them would.
+        words, deletes = self.words, self.deletes
+        found: Dict[int, int] = {}
+        prefix = word[: self.PREFIX_LENGTH]
+
+        for part in _deletes(prefix, bound):
+            if deadline is not None and perf_counter() >= deadline:
+                break
+
+            i = bisect_left(deletes, part)
+
+            if i == len(deletes) or deletes[i] != part:
+                continue
+
+            start, end = self.sources[i], self.sources[i + 1]
+
+            for w in self.origins[start:end]:
+                if w not in found:
+                    found[w] = distance(word, words[w], bound)
+
+        return {w: d for w, d in found.items() if d <= bound}
+
+    def search(
+        self, text: str, *, limit: int, timeout: Optional[float] = None
+    ) -> List[str]:
+        """Returns the names whose words are all within a few typos of
+        the words of the query, closest first, then shortest first.
+
+        Words of up to four characters may have one typo, and longer
+        ones two.
+
+        Parameters
+        ----------
+        text: :class:`str`
+            The text to search for.
+        limit: :class:`int`
+            The maximum number of names to return.
+        timeout: Optional[:class:`float`]
+            How long, in seconds, the search may take. Once it's over,
+            the names found so far are returned. Defaults to ``None``,
+            which searches the whole index.
+
+        Returns
+        -------
+        List[:class:`str`]
+            The matching names.
+        """
+        ranked = self.rank(text, limit=limit, timeout=timeout)
+        return [name for _, _, name in ranked]
+
+    def rank(
+        self, text: str, *, limit: int, timeout: Optional[float] = None
+    ) -> List[Tuple[int, int, str]]:
+        """Like :meth:`search`, but returns tuples of the form
+        (distance, length, name), to merge the results of several
+        indexes. Ties are broken by position in :attr:`names`.
+        """
+        deadline = None if timeout is None else perf_counter() + timeout
+        scores: Optional[Dict[int, int]] = None
+
+        for word in dict.fromkeys(tokenize(text)):
+            bound = 1 if len(word) <= 4 else self.MAX_TYPOS
+            found: Dict[int, int] = {}
+
+            for w, d in self._similar(word, bound, deadline).items():
+                start, end = self.postings[w], self.postings[w + 1]
+
+                for i in self.entries[start:end]:
+                    if d < found.get(i, bound + 1):
+                        found[i] = d
+
+            # Every word of the query must match a word of the name.
+            if scores is None:
+                scores = found
+            else:
+                keys: Set[int] = scores.keys() & found.keys()
+                scores = {i: scores[i] + found[i] for i in keys}
+
+            if not scores:
+                return []
+
+        if not scores:
+            return []
+
+        names = self.names
+        ranked: List[Tuple[int, int, int]] = nsmallest(
+            max(limit, 0),
+            ((d, len(names[i]), i) for i, d in scores.items()),
+        )
+        return [(d, length, names[i]) for d, length, i in ranked]
@@ -0,0 +1,145 @@
+"""
+Copyright (C) 2023  kyomi
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from mmap import mmap
+from typing import (
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Union,
+    overload,
+)
+
+# Buffers that strings can be searched in without copying them.
+Buffer = Union[bytes, mmap]
+
+
+class StringView(Sequence[str]):
+    """A read-only sequence of strings stored one after the other in a
+    UTF-8 buffer, e.g. a memory-mapped file. Strings are only decoded
+    when they're accessed, and are never kept around.
+
+    Parameters
+    ----------
+    buffer: :class:`bytes` | :class:`mmap.mmap`
+        The buffer holding the UTF-8 encoded strings, one after the
+        other.
+    base: :class:`int`
+        Where the strings start in ``buffer``.
+    offsets: Sequence[:class:`int`]
+        Where each string starts, from ``base``, followed by the length
+        of all of them.
+    order: Optional[Sequence[:class:`int`]]
+        The position of the string to return for each index, to read
+        the strings in another order than they're stored in. Defaults
+        to ``None``, which keeps the stored order.
+    """
+
+    __slots__ = ("buffer", "base", "offsets", "order")
+
+    def __init__(
+        self,
+        buffer: Buffer,
+        base: int,
+        offsets: Sequence[int],
+        order: Optional[Sequence[int]] = None,
+    ) -> None:
+        self.buffer = buffer
+        self.base = base
+        self.offsets = offsets
+        self.order = order
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @overload
+    def __getitem__(self, index: int) -> str:
+        ...
+
+    @overload
+    def __getitem__(self, index: slice) -> List[str]:
+        ...
+
+    def __getitem__(self, index: int | slice) -> str | List[str]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        if self.order is not None:
+            index = self.order[index]
+
+        start = self.base + self.offsets[index]
+        end = self.base + self.offsets[index + 1]
+
+        return str(self.buffer[start:end], "utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(len(self)):
+            yield self[i]
+
+
+class TextView:
+    """A read-only view over a UTF-8 buffer, decoded when sliced.
+    Offsets are in bytes, not in characters.
+
+    Parameters
+    ----------
+    data: :class:`memoryview`
+        The UTF-8 encoded text.
+    """
+
+    __slots__ = ("data",)
+
+    def __init__(self, data: memoryview) -> None:
+        self.data = data
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __getitem__(self, index: slice) -> str:
+        return str(self.data[index], "utf-8")
+
+    def __str__(self) -> str:
+        return str(self.data, "utf-8")
+
+
+class BitsetView(Mapping[str, int]):
+    """A read-only mapping from strings to bitsets stored as little
+    endian bytes in a buffer. Bitsets are turned into integers when
+    they're accessed, and are never kept around.
+
+    Parameters
+    ----------
+    bitsets: Dict[:class:`str`, :class:`memoryview`]
+        The bytes of the bitset of each key.
+    """
+
+    __slots__ = ("bitsets",)
+
+    def __init__(self, bitsets: Dict[str, memoryview]) -> None:
+        self.bitsets = bitsets
+
+    def __getitem__(self, key: str) -> int:
+        return int.from_bytes(self.bitsets[key], "little")
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.bitsets)
+
+    def __len__(self) -> int:
+        return len(self.bitsets)
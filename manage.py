@@ -15,96 +15,144 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
-import asyncio
-from contextlib import contextmanager
-from logging import INFO, WARN, Formatter, LogRecord, getLogger
-from logging.handlers import RotatingFileHandler
-from os import environ
-from typing import Generator
+from typing import TYPE_CHECKING, Optional
 
-from click import group
-from dotenv import load_dotenv
-from rich.logging import RichHandler
-from rich.text import Text
+from click import Choice, group, option
 
-from bot.core import Eris
+if TYPE_CHECKING:
+    from bot.utils.startup import StartupTimer
 
 
-class StreamHandler(RichHandler):
-    """A custom logging handler with prettier output."""
+async def run_bot(
+    startup: "StartupTimer",
+    metrics_port: Optional[int],
+    defer_extensions: bool,
+) -> None:
+    from os import environ
 
-    def __init__(self) -> None:
-        super().__init__(
-            omit_repeated_times=False,
-            rich_tracebacks=True,
-            tracebacks_show_locals=True,
-        )
+    from dotenv import load_dotenv
 
-    def get_level_text(self, record: LogRecord) -> Text:
-        levelname = record.levelname
-        style = f"logging.level.{levelname.lower()}"
-        return Text.styled(f"[{levelname}]", style=style)
+    from bot.core import Eris
 
+    startup.end("imports")
+    load_dotenv("config/.env")
 
-@contextmanager
-def setup_logging() -> Generator[None, None, None]:
-    log = getLogger()
+    async with Eris(
+        metrics_port=metrics_port,
+        startup=startup,
+        defer_extensions=defer_extensions,
+    ) as bot:
+        await bot.start(environ["DISCORD_TOKEN"])
 
-    try:
-        # __enter__
-        max_bytes = 32 * 1024 * 1024  # 32 MiB
 
-        getLogger("discord").setLevel(INFO)
-        getLogger("discord.http").setLevel(WARN)
+@group()
+def main() -> None:
+    pass
 
-        log.setLevel(INFO)
 
-        datetime_format = "%Y-%m-%d %H:%M:%S"
-        log_format = "[{asctime}] [{levelname}] {name}: {message}"
+@main.command()
+@option(
+    "--log-format",
+    type=Choice(["text", "json"]),
+    default="text",
+    show_default=True,
+    help="Format of the log file, JSON writes one object per line.",
+)
+@option(
+    "--metrics-port",
+    type=int,
+    default=None,
+    help="Serve Prometheus metrics locally on this port.",
+)
+@option(
+    "--defer-extensions/--no-defer-extensions",
+    default=True,
+    show_default=True,
+    help="Load extensions not needed to answer users once ready.",
+)
+def runbot(
+    log_format: str, metrics_port: Optional[int], defer_extensions: bool
+) -> None:
+    """Run the bot."""
+    # The bot and its dependencies take a while to import, so they are
+    # only imported when it's run, and the rest of the CLI starts right
+    # away.
+    from bot.utils.startup import StartupTimer
 
-        handler = RotatingFileHandler(
-            filename="logs/eris.log",
-            encoding="utf-8",
-            mode="w",
-            maxBytes=max_bytes,
-            backupCount=5,
-        )
-        formatter = Formatter(
-            fmt=log_format, datefmt=datetime_format, style="{"
-        )
+    startup = StartupTimer()
+    startup.begin("imports")
 
-        handler.setFormatter(formatter)
+    import asyncio
 
-        log.addHandler(handler)
-        log.addHandler(StreamHandler())
+    from bot.utils.logs import setup_logging
 
-        yield
-    finally:
-        # __exit__
-        handlers = log.handlers[:]
+    with setup_logging(log_format):
+        asyncio.run(run_bot(startup, metrics_port, defer_extensions))
 
-        for handler in handlers:
-            handler.close()
-            log.removeHandler(handler)
 
+@main.command()
+@option(
+    "--workers",
+    type=int,
+    default=None,
+    help="Number of worker processes.  [default: CPU count]",
+)
+@option(
+    "--shards",
+    type=int,
+    default=None,
+    help="Total number of shards.  [default: recommended by Discord]",
+)
+@option(
+    "--log-format",
+    type=Choice(["text", "json"]),
+    default="text",
+    show_default=True,
+    help="Format of the log files, JSON writes one object per line.",
+)
+@option(
+    "--metrics-port",
+    type=int,
+    default=None,
+    help=(
+        "Serve the metrics and health of the cluster locally on this "
+        "port, and those of each worker on the following ports."
+    ),
+)
+@option(
+    "--defer-extensions/--no-defer-extensions",
+    default=True,
+    show_default=True,
+    help="Load extensions not needed to answer users once ready.",
+)
+def runcluster(
+    workers: Optional[int],
+    shards: Optional[int],
+    log_format: str,
+    metrics_port: Optional[int],
+    defer_extensions: bool,
+) -> None:
+    """Run the bot in several processes, splitting its shards."""
+    import asyncio
+    from os import cpu_count
+
+    from dotenv import load_dotenv
+
+    from bot.utils.cluster import ClusterSupervisor
+    from bot.utils.logs import setup_logging
 
-async def run_bot() -> None:
     load_dotenv("config/.env")
 
-    async with Eris() as bot:
-        await bot.start(environ["DISCORD_TOKEN"])
+    supervisor = ClusterSupervisor(
+        workers or cpu_count() or 1,
+        shards,
+        metrics_port=metrics_port,
+        log_format=log_format,
+        defer_extensions=defer_extensions,
+    )
 
-
-@group()
-def main() -> None:
-    pass
-
-
-@main.command()
-def runbot() -> None:
-    """Run the bot."""
-    with setup_logging():
-        asyncio.run(run_bot())
+    with setup_logging(log_format, "eris-cluster"):
+        asyncio.run(supervisor.run())
 
 
 if __name__ == "__main__":